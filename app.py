@@ -1,21 +1,53 @@
-from flask import Flask, render_template_string, request, redirect, url_for, session, flash, send_file
+from flask import Flask, Response, make_response, render_template, render_template_string, request, redirect, url_for, session, flash, send_file, jsonify
 import json
 import os
+import sqlite3
+import threading
+import time
+import atexit
+import tempfile
+import shutil
+import zlib
+import bisect
+import base64
+import hashlib
+import types
+import uuid
+import re
+import zipfile
+import collections
+import subprocess
+import sys
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from urllib.parse import quote, unquote
+from werkzeug.http import is_resource_modified
 from datetime import datetime, timedelta
 import csv
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
 from functools import wraps
+import click
+import numpy as np
+from jinja2 import DictLoader
 import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
@@ -34,62 +66,261 @@ def login_required(view_func):
     return wrapped_view
 
 
-# Helper: clean up admins with no questions added in 24+ hours
+# Inactive-admin sweeper: admins that added no questions within
+# INACTIVE_ADMIN_HOURS of registering are deleted by a background thread every
+# SWEEP_INTERVAL seconds (0 disables it). Every worker runs the thread, but
+# sweeper.json records the last run, so only one sweep happens per interval.
+INACTIVE_ADMIN_HOURS = int(os.getenv('QUIZ_INACTIVE_ADMIN_HOURS', '24'))
+SWEEP_INTERVAL = int(os.getenv('QUIZ_SWEEP_INTERVAL', '3600'))
+SWEEP_STATE_FILE = 'sweeper.json'
+
+def find_inactive_admins(cutoff):
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute(
+            'SELECT username, created_at FROM admins '
+            'WHERE NOT EXISTS (SELECT 1 FROM questions WHERE questions.admin_id = admins.username)'
+        )
+        candidates = [(row['username'], row['created_at']) for row in rows]
+    else:
+        candidates = [(admin_id, admin_data.get('created_at')) for admin_id, admin_data in load_admins().items()]
+
+    inactive = []
+    for admin_id, created_at_str in candidates:
+        try:
+            created_at = datetime.fromisoformat(created_at_str)
+        except (TypeError, ValueError):
+            # If parsing fails, skip
+            continue
+        if created_at < cutoff and (STORAGE_BACKEND == 'sqlite' or not load_admin_questions(admin_id)):
+            inactive.append(admin_id)
+    return inactive
+
 def cleanup_inactive_admins():
-    admins = load_admins()
-    questions = load_questions()
-    now = datetime.utcnow()
-    cutoff = now - timedelta(hours=24)
-    
-    to_delete = []
-    for admin_id, admin_data in admins.items():
-        # Get admin's question count
-        admin_questions = questions.get(admin_id, [])
-        if not admin_questions:  # No questions
-            created_at_str = admin_data.get('created_at', '')
+    cutoff = datetime.utcnow() - timedelta(hours=INACTIVE_ADMIN_HOURS)
+    # The admins may add a question before the batch takes their locks
+    return delete_admins(find_inactive_admins(cutoff), only_if_empty=True)
+
+def read_sweep_state():
+    try:
+        return read_json(SWEEP_STATE_FILE)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def run_sweep(force=False):
+    # Returns the deleted admin ids, or None when another worker swept recently
+    with _named_lock('sweeper.lock'):
+        last_run = read_sweep_state().get('last_run')
+        if not force and last_run:
+            if datetime.utcnow() - datetime.fromisoformat(last_run) < timedelta(seconds=SWEEP_INTERVAL):
+                return None
+        started = time.monotonic()
+        deleted = cleanup_inactive_admins()
+        write_json_atomic(SWEEP_STATE_FILE, {
+            'last_run': datetime.utcnow().isoformat(),
+            'duration_ms': round((time.monotonic() - started) * 1000, 1),
+            'deleted': deleted
+        })
+    if deleted:
+        print(f"✓ Sweeper removed {len(deleted)} inactive admin(s): {', '.join(deleted)}")
+    return deleted
+
+def _sweeper_loop():
+    while True:
+        try:
+            run_sweep()
+        except Exception as e:
+            print(f"✗ Inactive-admin sweep failed: {e}")
+        try:
+            expire_export_jobs()
+        except Exception as e:
+            print(f"✗ Export cleanup failed: {e}")
+        time.sleep(max(min(SWEEP_INTERVAL, EXPORT_TTL), 60))
+
+_sweeper_pid = None
+
+def start_sweeper():
+    # One daemon thread per process; forked workers start their own
+    global _sweeper_pid
+    if SWEEP_INTERVAL <= 0 or _sweeper_pid == os.getpid():
+        return
+    _sweeper_pid = os.getpid()
+    threading.Thread(target=_sweeper_loop, name='admin-sweeper', daemon=True).start()
+
+@app.cli.command('sweep-admins')
+def sweep_admins_command():
+    """Delete admins that added no questions within QUIZ_INACTIVE_ADMIN_HOURS."""
+    deleted = run_sweep(force=True)
+    print(f"✓ Removed {len(deleted)} inactive admin(s)")
+
+
+# Email configuration - read from environment or use defaults
+SMTP_EMAIL = os.getenv('SMTP_EMAIL', 'your_email@gmail.com')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
+SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') == '1'
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '30'))
+
+def email_configured():
+    # Gmail needs a password; a custom relay (e.g. a local debugging server) may not
+    if SMTP_EMAIL == 'your_email@gmail.com':
+        return False
+    return bool(SMTP_PASSWORD) or SMTP_SERVER != 'smtp.gmail.com'
+
+
+# Email outbox: requests only queue a message file under OUTBOX_DIR; a
+# background thread sends due messages over one SMTP connection per batch and
+# reschedules failures with exponential backoff. After OUTBOX_MAX_ATTEMPTS a
+# message is moved to OUTBOX_DIR/failed.
+OUTBOX_DIR = os.getenv('QUIZ_OUTBOX_DIR', 'outbox')
+OUTBOX_POLL_INTERVAL = float(os.getenv('QUIZ_OUTBOX_POLL_INTERVAL', '5'))  # seconds between scans
+OUTBOX_BATCH = int(os.getenv('QUIZ_OUTBOX_BATCH', '50'))  # messages per SMTP connection
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('QUIZ_OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_RETRY_BASE = float(os.getenv('QUIZ_OUTBOX_RETRY_BASE', '30'))  # first retry delay, doubled per attempt
+OUTBOX_RETRY_MAX = 6 * 3600
+
+_outbox_wakeup = threading.Event()
+_outbox_counter = 0
+_outbox_counter_lock = threading.Lock()
+
+def queue_email(to_address, subject, body):
+    global _outbox_counter
+    if not email_configured():
+        print(f"[EMAIL - NOT SENT] Email credentials not configured.")
+        print(f"To: {to_address}")
+        print(f"Subject: {subject}")
+        return None
+    with _outbox_counter_lock:
+        _outbox_counter += 1
+        counter = _outbox_counter
+    # Names sort in queueing order
+    message_id = f'{time.time_ns()}-{os.getpid()}-{counter}'
+    os.makedirs(OUTBOX_DIR, exist_ok=True)
+    write_json_atomic(os.path.join(OUTBOX_DIR, message_id + '.json'), {
+        'id': message_id,
+        'to': to_address,
+        'subject': subject,
+        'body': body,
+        'created_at': datetime.utcnow().isoformat(),
+        'attempts': 0,
+        'next_attempt': 0,
+        'last_error': None
+    })
+    _outbox_wakeup.set()
+    return message_id
+
+def _due_outbox_messages(now):
+    try:
+        names = sorted(name for name in os.listdir(OUTBOX_DIR) if name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+    due = []
+    for name in names:
+        path = os.path.join(OUTBOX_DIR, name)
+        try:
+            message = read_json(path)
+        except (FileNotFoundError, ValueError):
+            continue
+        if message.get('next_attempt', 0) <= now:
+            due.append((path, message))
+            if len(due) >= OUTBOX_BATCH:
+                break
+    return due
+
+def _build_email(message):
+    msg = MIMEMultipart()
+    msg['From'] = SMTP_EMAIL
+    msg['To'] = message['to']
+    msg['Subject'] = message['subject']
+    msg.attach(MIMEText(message['body'], 'plain'))
+    return msg
+
+def _reschedule_email(path, message, error):
+    message['attempts'] += 1
+    message['last_error'] = str(error)
+    if message['attempts'] >= OUTBOX_MAX_ATTEMPTS:
+        failed_dir = os.path.join(OUTBOX_DIR, 'failed')
+        os.makedirs(failed_dir, exist_ok=True)
+        write_json_atomic(os.path.join(failed_dir, os.path.basename(path)), message)
+        os.remove(path)
+        print(f"✗ Giving up on email to {message['to']} after {message['attempts']} attempts: {error}")
+        return
+    delay = min(OUTBOX_RETRY_BASE * 2 ** (message['attempts'] - 1), OUTBOX_RETRY_MAX)
+    message['next_attempt'] = time.time() + delay
+    write_json_atomic(path, message)
+    print(f"✗ Error sending email to {message['to']} (attempt {message['attempts']}, retry in {int(delay)}s): {error}")
+
+def drain_outbox():
+    # Send every due message; returns (sent, failed)
+    sent = failed = 0
+    with _named_lock('outbox.lock'):
+        while True:
+            due = _due_outbox_messages(time.time())
+            if not due:
+                break
+            done = 0
             try:
-                created_at = datetime.fromisoformat(created_at_str)
-                if created_at < cutoff:  # Created more than 24 hours ago
-                    to_delete.append(admin_id)
-            except Exception:
-                # If parsing fails, skip
-                pass
-    
-    # Delete inactive admins and their data
-    for admin_id in to_delete:
-        del admins[admin_id]
-        questions.pop(admin_id, None)
-        allowed = load_allowed()
-        allowed.pop(admin_id, None)
-        save_allowed(allowed)
-        quiz_settings = load_quiz_settings()
-        quiz_settings.pop(admin_id, None)
-        save_quiz_settings(quiz_settings)
-        all_answers = load_answers()
-        all_answers.pop(admin_id, None)
-        save_answers(all_answers)
-    
-    if to_delete:
-        save_admins(admins)
-        save_questions(questions)
+                server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+                try:
+                    if SMTP_STARTTLS:
+                        server.starttls()
+                    if SMTP_PASSWORD:
+                        server.login(SMTP_EMAIL, SMTP_PASSWORD)
+                    for path, message in due:
+                        try:
+                            server.send_message(_build_email(message))
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                            # Rejected message; the connection is still usable
+                            _reschedule_email(path, message, e)
+                            failed += 1
+                        else:
+                            os.remove(path)
+                            sent += 1
+                            print(f"✓ Email sent to {message['to']}")
+                        done += 1
+                finally:
+                    try:
+                        server.quit()
+                    except (OSError, smtplib.SMTPException):
+                        server.close()
+            except (OSError, smtplib.SMTPException) as e:
+                # Connection, STARTTLS or login failure: the rest of the batch
+                # waits for the next attempt
+                for path, message in due[done:]:
+                    _reschedule_email(path, message, e)
+                return sent, failed + len(due) - done
+            if len(due) < OUTBOX_BATCH:
+                break
+    return sent, failed
+
+def _outbox_loop():
+    while True:
+        _outbox_wakeup.wait(OUTBOX_POLL_INTERVAL)
+        _outbox_wakeup.clear()
+        try:
+            drain_outbox()
+        except Exception as e:
+            print(f"✗ Outbox worker error: {e}")
+
+_outbox_pid = None
+
+def start_outbox_worker():
+    # One daemon thread per process; forked workers start their own
+    global _outbox_pid
+    if _outbox_pid == os.getpid():
+        return
+    _outbox_pid = os.getpid()
+    threading.Thread(target=_outbox_loop, name='email-outbox', daemon=True).start()
+
+@app.cli.command('send-outbox')
+def send_outbox_command():
+    """Send every queued email that is due now."""
+    sent, failed = drain_outbox()
+    print(f"✓ Sent {sent} email(s), {failed} failed")
 
 
 # Helper: send welcome email to admin
 def send_admin_welcome_email(admin_username, admin_email):
-    # Email configuration - read from environment or use defaults
-    sender_email = os.getenv('SMTP_EMAIL', 'your_email@gmail.com')
-    sender_password = os.getenv('SMTP_PASSWORD', '')
-    smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.getenv('SMTP_PORT', '587'))
-    
-    # If no credentials configured, just log (don't fail)
-    if not sender_password or sender_email == 'your_email@gmail.com':
-        print(f"[EMAIL - NOT SENT] Email credentials not configured.")
-        print(f"To: {admin_email}")
-        print(f"Subject: Welcome to Quiz Management System")
-        print(f"Username: {admin_username}")
-        return
-    
     subject = "Welcome to Quiz Management System"
     body = f"""
 Dear Administrator,
@@ -106,24 +337,14 @@ Please keep your credentials safe and secure.
 Best regards,
 Quiz Management System Team
 """
-    
-    try:
-        # Create email message
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = admin_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-        print(f"✓ Welcome email sent to {admin_email}")
-    except Exception as e:
-        print(f"✗ Error sending email to {admin_email}: {e}")
+    return queue_email(admin_email, subject, body)
+
 
+@app.before_request
+def start_background_workers():
+    start_sweeper()
+    start_outbox_worker()
+    start_log_flusher()
 
 @app.before_request
 def check_session_timeout():
@@ -151,26 +372,51 @@ ANSWERS_FILE = 'user_answers.json'
 QUIZ_SETTINGS_FILE = 'quiz_settings.json'
 ALLOWED_FILE = 'allowed_students.json'
 
-# Initialize files if they don't exist
-def init_files():
-    if not os.path.exists(ADMINS_FILE):
-        with open(ADMINS_FILE, 'w') as f:
-            json.dump({}, f)
-    if not os.path.exists(QUESTIONS_FILE):
-        with open(QUESTIONS_FILE, 'w') as f:
-            json.dump({}, f)
-    if not os.path.exists(ANSWERS_FILE):
-        with open(ANSWERS_FILE, 'w') as f:
-            json.dump({}, f)
-    if not os.path.exists(QUIZ_SETTINGS_FILE):
-        with open(QUIZ_SETTINGS_FILE, 'w') as f:
-            json.dump({}, f)
-    if not os.path.exists(ALLOWED_FILE):
-        with open(ALLOWED_FILE, 'w') as f:
-            json.dump({}, f)
-    
-    # Migrate old data format to new format
-    migrate_old_data()
+# Storage backend: 'json' (default, the files above) or 'sqlite'
+STORAGE_BACKEND = os.getenv('QUIZ_STORAGE', 'json').lower()
+DATABASE_FILE = os.getenv('QUIZ_DATABASE', 'quiz.db')
+
+# Per-admin data directories (JSON backend): data/<admin>/questions.json,
+# roster/, settings.json and results.json. The monolithic files above are
+# only read by migrate_to_shards; admins.json stays global.
+DATA_DIR = os.getenv('QUIZ_DATA_DIR', 'data')
+
+# Submission log mode (JSON backend): each submission is appended as one line
+# to data/<admin>/results.jsonl instead of rewriting results.json
+SUBMISSION_LOG = os.getenv('QUIZ_SUBMISSION_LOG', '0') == '1'
+SUBMISSION_FSYNC_EVERY = int(os.getenv('QUIZ_SUBMISSION_FSYNC_EVERY', '20'))  # submissions per fsync
+SUBMISSION_FSYNC_INTERVAL = float(os.getenv('QUIZ_SUBMISSION_FSYNC_INTERVAL', '1.0'))  # max seconds between fsyncs
+
+# Storage bootstrap: runs once at startup. The data layout version is stored
+# with the data (data/.schema-version for JSON, PRAGMA user_version for
+# SQLite), so migrations run once per data directory and requests never touch it.
+SCHEMA_VERSION = 1
+SCHEMA_VERSION_FILE = os.path.join(DATA_DIR, '.schema-version')
+
+def _json_schema_version():
+    try:
+        return read_json(SCHEMA_VERSION_FILE).get('version', 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def bootstrap_storage():
+    global _shards_ready
+    with _named_lock('bootstrap.lock'):
+        if STORAGE_BACKEND == 'sqlite':
+            init_db()
+            return
+        if _json_schema_version() >= SCHEMA_VERSION:
+            _shards_ready = True
+            return
+        if not os.path.exists(ADMINS_FILE):
+            with open(ADMINS_FILE, 'w') as f:
+                json.dump({}, f)
+
+        # Migrate old data format to new format
+        migrate_old_data()
+        with _roster_index_lock():
+            rebuild_roster_index()
+        write_json_atomic(SCHEMA_VERSION_FILE, {'version': SCHEMA_VERSION, 'migrated_at': datetime.now().isoformat()})
 
 def migrate_old_data():
     """Convert old list format to new dictionary format"""
@@ -186,7 +432,7 @@ def migrate_old_data():
                 
                 # Create default admin if questions exist
                 if data:
-                    admins = load_admins()
+                    admins = read_json(ADMINS_FILE)
                     if 'default_admin' not in admins:
                         admins['default_admin'] = {
                             'password': 'admin123',
@@ -208,54 +454,2706 @@ def migrate_old_data():
     except:
         pass
 
-# Load admins
-def load_admins():
-    with open(ADMINS_FILE, 'r') as f:
-        return json.load(f)
+    # Split the monolithic files into per-admin directories
+    migrate_to_shards()
+
+
+# SQLite storage engine
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS admins (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    email TEXT,
+    phone TEXT,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS questions (
+    admin_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    question TEXT,
+    options TEXT NOT NULL,
+    correct_answer TEXT,
+    qid TEXT,
+    PRIMARY KEY (admin_id, position)
+);
+CREATE TABLE IF NOT EXISTS question_versions (
+    admin_id TEXT NOT NULL,
+    version TEXT NOT NULL,
+    questions TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (admin_id, version)
+);
+CREATE TABLE IF NOT EXISTS roster (
+    id INTEGER PRIMARY KEY,
+    admin_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    name_norm TEXT NOT NULL,
+    sid_norm TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS roster_admin ON roster (admin_id, id);
+CREATE INDEX IF NOT EXISTS roster_lookup ON roster (name_norm, sid_norm);
+CREATE INDEX IF NOT EXISTS roster_student ON roster (admin_id, sid_norm);
+CREATE TABLE IF NOT EXISTS settings (
+    admin_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    admin_id TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    results TEXT NOT NULL,
+    student_id TEXT,
+    quiz_version TEXT,
+    answers TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_admin ON submissions (admin_id, id);
+CREATE INDEX IF NOT EXISTS submissions_time ON submissions (admin_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS submissions_score ON submissions (admin_id, (CASE WHEN total > 0 THEN ROUND(score * 100.0 / total, 2) ELSE 0 END), id);
+CREATE INDEX IF NOT EXISTS submissions_name ON submissions (admin_id, (LOWER(TRIM(student_name))), id);
+CREATE TABLE IF NOT EXISTS submitters (
+    admin_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (admin_id, key)
+);
+CREATE TABLE IF NOT EXISTS analytics (
+    admin_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+'''
+
+_db_local = threading.local()
+_db_schema_ready = False
+
+def get_db():
+    # One connection per thread (and per process, so forked workers never share one)
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None or _db_local.pid != os.getpid():
+        conn = sqlite3.connect(DATABASE_FILE, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _db_local.conn = conn
+        _db_local.pid = os.getpid()
+        if not _db_schema_ready:
+            _create_schema(conn)
+    return conn
+
+def _create_schema(conn):
+    global _db_schema_ready
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+        _db_schema_ready = True
+        return
+    conn.executescript(SQLITE_SCHEMA)
+    with conn:
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    _db_schema_ready = True
+
+def _db_publish_unversioned(conn):
+    # Imported quizzes from before publishing existed stay live as they are
+    for admin_id in [row['admin_id'] for row in conn.execute('SELECT DISTINCT admin_id FROM questions')]:
+        row = conn.execute('SELECT data FROM settings WHERE admin_id = ?', (admin_id,)).fetchone()
+        settings = json.loads(row['data']) if row else {'time_limit': 0}
+        if 'published_version' not in settings:
+            rows = conn.execute('SELECT * FROM questions WHERE admin_id = ? ORDER BY position', (admin_id,))
+            settings['published_version'] = _db_store_quiz_version(conn, admin_id, [_db_question(row) for row in rows])
+            _db_write_settings(conn, admin_id, settings)
+
+def init_db():
+    _create_schema(get_db())
+
+def _normalize(value):
+    return (value or '').strip().lower()
+
+# One submission per student and quiz. Students are identified by student_id;
+# results stored before the student_id was recorded only carry a name.
+def _submitter_key(entry):
+    # entry is a result dict or a submissions row
+    student_id = _normalize(entry['student_id'] if 'student_id' in entry.keys() else None)
+    if student_id:
+        return 'id:' + student_id
+    return 'name:' + _normalize(entry['student_name'])
+
+def _submitter_lookup_keys(student_name, student_id):
+    return ['id:' + _normalize(student_id), 'name:' + _normalize(student_name)]
+
+def _db_question(row):
+    question = {
+        'question': row['question'],
+        'options': json.loads(row['options']),
+        'correct_answer': row['correct_answer']
+    }
+    if row['qid'] is not None:
+        question['id'] = row['qid']
+    return question
+
+def _db_answer(row):
+    answer = {
+        'id': str(row['id']),
+        'student_name': row['student_name'],
+        'score': row['score'],
+        'total': row['total'],
+        'timestamp': row['timestamp']
+    }
+    if row['quiz_version'] is not None:
+        answer['quiz_version'] = row['quiz_version']
+        answer['answers'] = json.loads(row['answers'])
+    else:
+        answer['results'] = json.loads(row['results'])
+    if row['student_id'] is not None:
+        answer['student_id'] = row['student_id']
+    return answer
+
+def _db_write_admins(conn, admins):
+    conn.executemany(
+        'INSERT OR REPLACE INTO admins (username, password, email, phone, created_at) VALUES (?, ?, ?, ?, ?)',
+        [(username, data.get('password', ''), data.get('email'), data.get('phone'), data.get('created_at'))
+         for username, data in admins.items()]
+    )
+
+def _db_write_questions(conn, admin_id, questions):
+    questions = _with_question_ids(questions)
+    conn.execute('DELETE FROM questions WHERE admin_id = ?', (admin_id,))
+    conn.executemany(
+        'INSERT INTO questions (admin_id, position, question, options, correct_answer, qid) VALUES (?, ?, ?, ?, ?, ?)',
+        [(admin_id, position, q.get('question'), json.dumps(q.get('options', {})), q.get('correct_answer'), q['id'])
+         for position, q in enumerate(questions)]
+    )
+
+def _db_write_allowed(conn, admin_id, students):
+    conn.execute('DELETE FROM roster WHERE admin_id = ?', (admin_id,))
+    _db_insert_allowed(conn, admin_id, students)
+
+def _db_insert_allowed(conn, admin_id, students):
+    conn.executemany(
+        'INSERT INTO roster (admin_id, name, student_id, name_norm, sid_norm) VALUES (?, ?, ?, ?, ?)',
+        [(admin_id, s.get('name') or '', s.get('student_id') or '', _normalize(s.get('name')), _normalize(s.get('student_id')))
+         for s in students]
+    )
+
+def _db_write_settings(conn, admin_id, settings):
+    conn.execute('INSERT OR REPLACE INTO settings (admin_id, data) VALUES (?, ?)', (admin_id, json.dumps(settings)))
+
+def _db_insert_answers(conn, admin_id, entries):
+    conn.executemany(
+        'INSERT INTO submissions (admin_id, student_name, student_id, score, total, timestamp, results, quiz_version, answers) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(admin_id, e.get('student_name') or '', e.get('student_id'), e.get('score', 0), e.get('total', 0), e.get('timestamp') or '',
+          json.dumps(e.get('results', [])), e.get('quiz_version'), json.dumps(e['answers']) if 'answers' in e else None)
+         for e in entries]
+    )
+    conn.executemany('INSERT OR IGNORE INTO submitters (admin_id, key) VALUES (?, ?)',
+                     [(admin_id, _submitter_key(e)) for e in entries])
+
+def import_json_to_sqlite():
+    """One-shot import of the JSON data files into the SQLite database"""
+    admins = read_legacy_json(ADMINS_FILE)
+    versions = []
+    if os.path.isdir(DATA_DIR):
+        questions, answers, settings, allowed = {}, {}, {}, {}
+        for admin_id in shard_admins():
+            versions.extend((admin_id, snapshot) for snapshot in _json_quiz_versions(admin_id))
+            questions[admin_id] = _read_shard(admin_id, 'questions.json', [])
+            answers[admin_id] = _read_shard(admin_id, 'results.json', []) + read_submission_log(admin_id)
+            settings[admin_id] = _read_shard(admin_id, 'settings.json', {'time_limit': 0})
+            allowed[admin_id] = _json_load_allowed(admin_id)
+    else:
+        questions = read_legacy_json(QUESTIONS_FILE)
+        answers = read_legacy_json(ANSWERS_FILE)
+        settings = read_legacy_json(QUIZ_SETTINGS_FILE)
+        allowed = read_legacy_json(ALLOWED_FILE)
+
+    init_db()
+    conn = get_db()
+    with conn:
+        for table in ('admins', 'questions', 'question_versions', 'roster', 'settings', 'submissions', 'submitters', 'analytics'):
+            conn.execute(f'DELETE FROM {table}')
+        _db_write_admins(conn, admins)
+        conn.executemany(
+            'INSERT OR IGNORE INTO question_versions (admin_id, version, questions, created_at) VALUES (?, ?, ?, ?)',
+            [(admin_id, s['version'], json.dumps(s['questions']), s['created_at']) for admin_id, s in versions]
+        )
+        for admin_id, admin_questions in questions.items():
+            _db_write_questions(conn, admin_id, admin_questions)
+        for admin_id, students in allowed.items():
+            _db_write_allowed(conn, admin_id, students)
+        for admin_id, admin_settings in settings.items():
+            _db_write_settings(conn, admin_id, admin_settings)
+        for admin_id, entries in answers.items():
+            _db_insert_answers(conn, admin_id, entries)
+        _db_publish_unversioned(conn)
+
+    return {
+        'admins': len(admins),
+        'questions': sum(len(v) for v in questions.values()),
+        'students': sum(len(v) for v in allowed.values()),
+        'submissions': sum(len(v) for v in answers.values())
+    }
+
+@app.cli.command('import-json')
+def import_json_command():
+    """Import admins.json, questions.json, etc. into the SQLite database."""
+    counts = import_json_to_sqlite()
+    print(f"✓ Imported into {DATABASE_FILE}: " + ', '.join(f"{v} {k}" for k, v in counts.items()))
+
+
+# Atomic writes and cross-process locks
+LOCK_DIR = '.locks'
+LOCK_STRIPES = int(os.getenv('QUIZ_LOCK_STRIPES', '64'))
+
+def write_json_atomic(path, data, sync=True):
+    # Write to a temp file in the same directory and rename it over the target,
+    # so readers and crashes only ever see the old or the new file. sync=False
+    # skips the fsync for data that can be rebuilt after a crash.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        invalidate_json_cache(path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+_held_locks = threading.local()
+_fallback_locks = {}
+_fallback_locks_guard = threading.Lock()
+
+@contextmanager
+def _named_lock(name):
+    # Exclusive fcntl lock on .locks/<name>, re-entrant within a thread. Without
+    # fcntl (Windows development) this falls back to an in-process lock.
+    held = getattr(_held_locks, 'names', None)
+    if held is None:
+        held = _held_locks.names = {}
+    if held.get(name):
+        held[name] += 1
+        try:
+            yield
+        finally:
+            held[name] -= 1
+        return
+
+    if fcntl is None:
+        with _fallback_locks_guard:
+            lock = _fallback_locks.setdefault(name, threading.Lock())
+        with lock:
+            held[name] = 1
+            try:
+                yield
+            finally:
+                held[name] = 0
+        return
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    fd = os.open(os.path.join(LOCK_DIR, name), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        held[name] = 1
+        try:
+            yield
+        finally:
+            held[name] = 0
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def file_lock(path):
+    # Guards read-modify-write of a data file shared by all admins
+    return _named_lock(os.path.basename(path) + '.lock')
+
+def admin_lock(admin_id):
+    # Guards one admin's data. Admins are striped over LOCK_STRIPES lock files, so
+    # different quizzes rarely contend. Take it before any file_lock.
+    return _named_lock(f'admin-{_admin_stripe(admin_id):03d}.lock')
+
+def _admin_stripe(admin_id):
+    return zlib.crc32(admin_id.encode('utf-8')) % LOCK_STRIPES
+
+
+# Append-only submission log
+def _submission_log_path(admin_id):
+    return _shard_file(admin_id, 'results.jsonl')
+
+_fsync_pending = {}  # log path -> (unsynced submissions, monotonic time of the first one)
+_fsync_lock = threading.Lock()
+
+def append_submission_log(admin_id, entry):
+    os.makedirs(admin_dir(admin_id), exist_ok=True)
+    path = _submission_log_path(admin_id)
+    line = (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        # A single O_APPEND write keeps each line whole
+        os.write(fd, line)
+        now = time.monotonic()
+        with _fsync_lock:
+            count, since = _fsync_pending.get(path, (0, now))
+            count += 1
+            sync = count >= SUBMISSION_FSYNC_EVERY or now - since >= SUBMISSION_FSYNC_INTERVAL
+            if sync:
+                _fsync_pending.pop(path, None)
+            else:
+                _fsync_pending[path] = (count, since)
+        if sync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def flush_submission_logs():
+    # fsync every log that still has submissions waiting for a batch
+    with _fsync_lock:
+        paths = list(_fsync_pending)
+        _fsync_pending.clear()
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+atexit.register(flush_submission_logs)
+
+def _log_flusher_loop():
+    # Bounds the unsynced window when no further submission arrives
+    while True:
+        time.sleep(SUBMISSION_FSYNC_INTERVAL)
+        try:
+            flush_submission_logs()
+        except Exception as e:
+            print(f"✗ Submission log flush failed: {e}")
+
+_log_flusher_pid = None
+
+def start_log_flusher():
+    # One daemon thread per process; forked workers start their own
+    global _log_flusher_pid
+    if not SUBMISSION_LOG or SUBMISSION_FSYNC_INTERVAL <= 0 or _log_flusher_pid == os.getpid():
+        return
+    _log_flusher_pid = os.getpid()
+    threading.Thread(target=_log_flusher_loop, name='submission-log-flusher', daemon=True).start()
+
+def _iter_submission_log_lines(admin_id, offset):
+    # (entry, offset past its line) for every whole line from byte offset on;
+    # entry is None for a line that doesn't parse
+    try:
+        f = open(_submission_log_path(admin_id), 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                # Torn last line from a crash mid-append
+                return
+            offset += len(line)
+            try:
+                yield json.loads(line), offset
+            except ValueError:
+                # A torn line that later appends ran on from
+                yield None, offset
+
+def iter_submission_log(admin_id):
+    for entry, _ in _iter_submission_log_lines(admin_id, 0):
+        if entry is not None:
+            yield entry
+
+def read_submission_log(admin_id):
+    return list(iter_submission_log(admin_id))
+
+def read_submission_log_from(admin_id, offset):
+    # (entries, offset past the last whole line) for the log from byte offset on
+    entries = []
+    for entry, offset in _iter_submission_log_lines(admin_id, offset):
+        if entry is not None:
+            entries.append(entry)
+    return entries, offset
+
+def submission_log_size(admin_id):
+    try:
+        return os.path.getsize(_submission_log_path(admin_id))
+    except FileNotFoundError:
+        return 0
+
+def remove_submission_log(admin_id):
+    try:
+        os.remove(_submission_log_path(admin_id))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+# Submitter keys (JSON backend): data/<admin>/submitters.keys holds one
+# _submitter_key per line and is appended under the admin lock right before the
+# submission itself, so a crash in between can never let a student submit
+# twice. Readers keep the parsed set and only read newly appended lines, so a
+# duplicate check is O(1).
+_submitter_cache = {}  # path -> (inode, bytes parsed, set of keys)
+
+def _submitter_keys_path(admin_id):
+    return _shard_file(admin_id, 'submitters.keys')
+
+def load_submitter_keys(admin_id):
+    # Read-only set of keys; rebuilt from stored results if the file is missing
+    path = _submitter_keys_path(admin_id)
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return _rebuild_submitter_keys(admin_id)
+    with f:
+        st = os.fstat(f.fileno())
+        cached = _submitter_cache.get(path)
+        if cached is not None and cached[0] == st.st_ino and cached[1] <= st.st_size:
+            _, offset, keys = cached
+            if offset == st.st_size:
+                return keys
+            f.seek(offset)
+        else:
+            offset, keys = 0, set()
+        data = f.read()
+    # Leave a torn last line for the next read
+    complete = data.rfind(b'\n') + 1
+    keys.update(line for line in data[:complete].decode('utf-8').split('\n') if line)
+    _submitter_cache[path] = (st.st_ino, offset + complete, keys)
+    return keys
+
+def _rebuild_submitter_keys(admin_id):
+    with admin_lock(admin_id):
+        path = _submitter_keys_path(admin_id)
+        if os.path.exists(path):
+            return load_submitter_keys(admin_id)
+        entries = load_admin_answers(admin_id)
+        if not entries:
+            return set()
+        keys = {_submitter_key(entry) for entry in entries}
+        fd, tmp_path = tempfile.mkstemp(dir=admin_dir(admin_id), prefix='.submitters.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(''.join(key + '\n' for key in keys))
+        os.replace(tmp_path, path)
+        return load_submitter_keys(admin_id)
+
+def _append_submitter_key(admin_id, key):
+    # Returns the file size before the append, for _truncate_submitter_keys
+    fd = os.open(_submitter_keys_path(admin_id), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        size = os.fstat(fd).st_size
+        os.write(fd, (key + '\n').encode('utf-8'))
+    finally:
+        os.close(fd)
+    return size
+
+def _truncate_submitter_keys(admin_id, size):
+    # Undo an append whose submission could not be stored (admin lock held)
+    path = _submitter_keys_path(admin_id)
+    _submitter_cache.pop(path, None)
+    os.truncate(path, size)
+
+def _remove_submitter_keys(admin_id):
+    path = _submitter_keys_path(admin_id)
+    _submitter_cache.pop(path, None)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Read-through cache for the JSON data files. An entry is valid while the
+# file's inode, mtime and size are unchanged; every save replaces the file via
+# rename, so writes from any gunicorn worker invalidate it. Cached data is
+# shared, so callers must treat it as read-only.
+_json_cache = {}  # path -> ((inode, mtime_ns, size), data)
+_json_cache_stats = {'hits': 0, 'misses': 0}
+_json_cache_lock = threading.Lock()
+
+def read_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+JSON_STREAM_CHUNK = 64 * 1024
+_JSON_SKIP = re.compile(r'[\s,]*')
+
+def iter_json_array(path):
+    # Items of a JSON array file, decoded one at a time from chunked reads
+    # so the whole array is never held in memory
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(JSON_STREAM_CHUNK).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f'{path} does not hold a JSON array')
+        pos = 1
+        while True:
+            pos = _JSON_SKIP.match(buffer, pos).end()
+            if pos == len(buffer):
+                buffer, pos = f.read(JSON_STREAM_CHUNK), 0
+                if not buffer:
+                    raise ValueError(f'{path} ends inside the JSON array')
+                continue
+            if buffer[pos] == ']':
+                return
+            while True:
+                # A value is only complete once something follows it
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer):
+                        break
+                except ValueError:
+                    pass
+                chunk = f.read(max(JSON_STREAM_CHUNK, len(buffer) - pos))
+                if not chunk:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    break
+                buffer, pos = buffer[pos:] + chunk, 0
+            yield item
+            pos = end
+
+def read_json_cached(path):
+    st = os.stat(path)
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _json_cache.get(path)
+    if cached is not None and cached[0] == key:
+        with _json_cache_lock:
+            _json_cache_stats['hits'] += 1
+        return cached[1]
+    data = read_json(path)
+    with _json_cache_lock:
+        _json_cache_stats['misses'] += 1
+        _json_cache[path] = (key, data)
+    return data
+
+def invalidate_json_cache(path):
+    _json_cache.pop(path, None)
+
+def cache_stats():
+    with _json_cache_lock:
+        stats = dict(_json_cache_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups * 100, 2) if lookups else 0
+    stats['entries'] = len(_json_cache)
+    return stats
+
+
+# Per-admin data directories
+def admin_filename(admin_id):
+    # Admin ids are user-chosen usernames, so quote them before using them as file names
+    return quote(admin_id, safe='').replace('.', '%2E')
+
+_shards_ready = False
+
+def admin_dir(admin_id):
+    if not _shards_ready:
+        migrate_to_shards()
+    return os.path.join(DATA_DIR, admin_filename(admin_id))
+
+def shard_admins():
+    # Admin ids that have a data directory (dot-names are staging/tombstone dirs)
+    if not _shards_ready:
+        migrate_to_shards()
+    return [unquote(name) for name in os.listdir(DATA_DIR) if not name.startswith('.')]
+
+def _shard_file(admin_id, name):
+    return os.path.join(admin_dir(admin_id), name)
+
+def _read_shard(admin_id, name, default):
+    # Cached, read-only
+    try:
+        return read_json_cached(_shard_file(admin_id, name))
+    except FileNotFoundError:
+        return default
+
+def _write_shard(admin_id, name, data, sync=True):
+    path = _shard_file(admin_id, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_json_atomic(path, data, sync)
+
+def read_legacy_json(path):
+    if not os.path.exists(path):
+        return {}
+    data = read_json(path)
+    # Old list format belongs to the default admin (see migrate_old_data)
+    return {'default_admin': data} if isinstance(data, list) else data
+
+def migrate_to_shards():
+    """Split the monolithic data files into one directory per admin"""
+    global _shards_ready
+    if os.path.isdir(DATA_DIR):
+        _shards_ready = True
+        return
+
+    questions = read_legacy_json(QUESTIONS_FILE)
+    answers = read_legacy_json(ANSWERS_FILE)
+    settings = read_legacy_json(QUIZ_SETTINGS_FILE)
+    allowed = read_legacy_json(ALLOWED_FILE)
+
+    # Build the new layout in a staging directory and rename it into place, so
+    # concurrent workers either see no data directory or a complete one
+    parent = os.path.dirname(os.path.abspath(DATA_DIR))
+    staging = tempfile.mkdtemp(dir=parent, prefix='.' + os.path.basename(DATA_DIR) + '-migrating-')
+    try:
+        admin_ids = set(questions) | set(answers) | set(settings) | set(allowed)
+        for admin_id in admin_ids:
+            directory = os.path.join(staging, admin_filename(admin_id))
+            os.mkdir(directory)
+            files = {name: data[admin_id] for name, data in (
+                ('questions.json', questions), ('results.json', answers),
+                ('settings.json', settings), ('roster.json', allowed)) if admin_id in data}
+            if files.get('questions.json'):
+                # Questions get stable ids, and quizzes from before publishing
+                # existed stay live as they are
+                admin_questions = files['questions.json'] = _with_question_ids(files['questions.json'])
+                version = quiz_version(admin_questions)
+                files[os.path.join('versions', version + '.json')] = {
+                    'version': version, 'created_at': datetime.now().isoformat(), 'questions': admin_questions}
+                files['settings.json'] = dict(files.get('settings.json') or {'time_limit': 0}, published_version=version)
+            if 'results.json' in files:
+                files['results.json'] = [dict(e, id=new_result_id()) for e in files['results.json']]
+            if 'roster.json' in files:
+                files.update(roster_shard_files(files.pop('roster.json')))
+            for name, data in files.items():
+                os.makedirs(os.path.dirname(os.path.join(directory, name)), exist_ok=True)
+                with open(os.path.join(directory, name), 'w') as f:
+                    json.dump(data, f, indent=2)
+        os.chmod(staging, 0o755)
+        os.rename(staging, DATA_DIR)
+        print(f"✓ Migrated data for {len(admin_ids)} admin(s) into {DATA_DIR}/")
+    except OSError:
+        # Another worker finished the migration first
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(DATA_DIR):
+            raise
+    _shards_ready = True
+
+
+# Eligibility index (JSON backend): normalized (name, student_id) -> admin ids
+# whose roster lists that student, so /start and submit_quiz are one dict
+# lookup instead of a scan over every roster. The SQLite backend uses the
+# roster_lookup index instead. The index is sharded into ROSTER_INDEX_BUCKETS
+# files by a hash prefix of the student key (data/.roster-index/<prefix>.json),
+# so a roster change rewrites only the buckets of the students it touches.
+# Writers and rebuilds serialize on one lock; readers never lock.
+ROSTER_INDEX_DIR = os.path.join(DATA_DIR, '.roster-index')
+ROSTER_INDEX_BUCKETS = 256
+
+def _student_key(student_name, student_id):
+    return _normalize(student_name) + '\x1f' + _normalize(student_id)
+
+def _roster_index_bucket(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:2]
+
+def _roster_index_path(bucket):
+    return os.path.join(ROSTER_INDEX_DIR, bucket + '.json')
+
+def _roster_index_lock():
+    return _named_lock('roster-index.lock')
+
+def rebuild_roster_index():
+    # Call with the roster index lock held
+    index = {}
+    for admin_id in shard_admins():
+        for entry in load_admin_allowed(admin_id):
+            admin_ids = index.setdefault(_student_key(entry.get('name'), entry.get('student_id')), [])
+            if admin_id not in admin_ids:
+                admin_ids.append(admin_id)
+    buckets = {}
+    for key, admin_ids in index.items():
+        buckets.setdefault(_roster_index_bucket(key), {})[key] = admin_ids
+    # Build next to the live index and swap it in, so readers see either one
+    staging = ROSTER_INDEX_DIR + f'.tmp-{os.getpid()}'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for bucket, entries in buckets.items():
+        write_json_atomic(os.path.join(staging, bucket + '.json'), entries)
+    tombstone = ROSTER_INDEX_DIR + f'.old-{os.getpid()}'
+    try:
+        os.rename(ROSTER_INDEX_DIR, tombstone)
+    except FileNotFoundError:
+        tombstone = None
+    os.rename(staging, ROSTER_INDEX_DIR)
+    if tombstone:
+        shutil.rmtree(tombstone, ignore_errors=True)
+    return index
+
+def roster_index_admins(key):
+    # Admin ids listing this student key (cached, read-only)
+    path = _roster_index_path(_roster_index_bucket(key))
+    try:
+        return read_json_cached(path).get(key, [])
+    except FileNotFoundError:
+        pass
+    with _roster_index_lock():
+        if not os.path.isdir(ROSTER_INDEX_DIR):
+            return rebuild_roster_index().get(key, [])
+    try:
+        return read_json_cached(path).get(key, [])
+    except FileNotFoundError:
+        return []  # No student in this bucket yet
+
+def apply_roster_index_delta(admin_id, removed, added):
+    # Remove/add the admin for the given student keys, rewriting only the
+    # buckets those keys hash to. Call after the roster change is on disk, so
+    # a missing index is rebuilt correctly.
+    if not removed and not added:
+        return
+    changes = {}
+    for key in removed:
+        changes.setdefault(_roster_index_bucket(key), ([], []))[0].append(key)
+    for key in added:
+        changes.setdefault(_roster_index_bucket(key), ([], []))[1].append(key)
+    with _roster_index_lock():
+        if not os.path.isdir(ROSTER_INDEX_DIR):
+            rebuild_roster_index()
+            return
+        for bucket, (bucket_removed, bucket_added) in changes.items():
+            path = _roster_index_path(bucket)
+            try:
+                index = read_json(path)
+            except FileNotFoundError:
+                index = {}
+            for key in bucket_removed:
+                admin_ids = [a for a in index.get(key, []) if a != admin_id]
+                if admin_ids:
+                    index[key] = admin_ids
+                else:
+                    index.pop(key, None)
+            for key in bucket_added:
+                admin_ids = index.setdefault(key, [])
+                if admin_id not in admin_ids:
+                    admin_ids.append(admin_id)
+            write_json_atomic(path, index)
+
+def drop_admins_from_roster_index(admin_ids):
+    # Call after the admins' data directories are gone, so a missing index is
+    # rebuilt without them
+    admin_ids = set(admin_ids)
+    with _roster_index_lock():
+        try:
+            names = os.listdir(ROSTER_INDEX_DIR)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(ROSTER_INDEX_DIR, name)
+            index = read_json(path)
+            changed = False
+            for key in list(index):
+                remaining = [a for a in index[key] if a not in admin_ids]
+                if len(remaining) != len(index[key]):
+                    changed = True
+                    if remaining:
+                        index[key] = remaining
+                    else:
+                        del index[key]
+            if changed:
+                write_json_atomic(path, index)
+
+@app.cli.command('rebuild-roster-index')
+def rebuild_roster_index_command():
+    """Rebuild the student eligibility index from the per-admin rosters."""
+    with _roster_index_lock():
+        index = rebuild_roster_index()
+    print(f"✓ Indexed {len(index)} student(s) in {ROSTER_INDEX_DIR}/")
+
+
+# Load admins (cached, read-only)
+def load_admins():
+    if STORAGE_BACKEND == 'sqlite':
+        admins = {}
+        for row in get_db().execute('SELECT * FROM admins'):
+            admin = {'password': row['password']}
+            if row['email'] is not None:
+                admin['email'] = row['email']
+            if row['phone'] is not None:
+                admin['phone'] = row['phone']
+            admin['created_at'] = row['created_at']
+            admins[row['username']] = admin
+        return admins
+    return read_json_cached(ADMINS_FILE)
+
+# Save admins
+def save_admins(admins):
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            _db_write_admins(conn, admins)
+            existing = [row['username'] for row in conn.execute('SELECT username FROM admins')]
+            conn.executemany('DELETE FROM admins WHERE username = ?', [(u,) for u in existing if u not in admins])
+        return
+    write_json_atomic(ADMINS_FILE, admins)
+
+# Load quiz settings (cached, read-only)
+def load_quiz_settings():
+    if STORAGE_BACKEND == 'sqlite':
+        return {row['admin_id']: json.loads(row['data']) for row in get_db().execute('SELECT * FROM settings')}
+    return {admin_id: load_admin_settings(admin_id) for admin_id in shard_admins()}
+
+
+# Running quiz analytics per admin, updated in O(1) by add_answer so the
+# dashboard never re-walks stored results. Stored in data/<admin>/analytics.json
+# or the analytics table; rebuild with 'flask rebuild-analytics'. With the
+# submission log, analytics.json also records how far into the log it reaches.
+PASS_MARK = 70
+GRADE_BUCKETS = [('A (90-100%)', 90), ('B (80-89%)', 80), ('C (70-79%)', 70), ('D (60-69%)', 60), ('F (<60%)', 0)]
+
+def result_percentage(entry):
+    return round((entry['score'] / entry['total']) * 100, 2) if entry['total'] > 0 else 0
+
+def _empty_analytics():
+    return {'count': 0, 'sum': 0.0, 'sum_sq': 0.0, 'min': None, 'max': None, 'pass_count': 0,
+            'buckets': [0] * len(GRADE_BUCKETS)}
+
+def _add_to_analytics(stats, percentage):
+    stats['count'] += 1
+    stats['sum'] += percentage
+    stats['sum_sq'] += percentage * percentage
+    stats['min'] = percentage if stats['min'] is None else min(stats['min'], percentage)
+    stats['max'] = percentage if stats['max'] is None else max(stats['max'], percentage)
+    if percentage >= PASS_MARK:
+        stats['pass_count'] += 1
+    for i, (_, floor) in enumerate(GRADE_BUCKETS):
+        if percentage >= floor:
+            stats['buckets'][i] += 1
+            break
+
+def compute_analytics(entries):
+    stats = _empty_analytics()
+    for entry in entries:
+        _add_to_analytics(stats, result_percentage(entry))
+    return stats
+
+def analytics_summary(stats):
+    # Dashboard view of the running aggregates
+    count = stats['count']
+    if not count:
+        return {'total_students': 0, 'average_score': 0, 'highest_score': 0, 'lowest_score': 0,
+                'pass_count': 0, 'fail_count': 0, 'pass_rate': 0, 'std_dev': 'N/A',
+                'grade_labels': [label for label, _ in GRADE_BUCKETS], 'grade_counts': [0] * len(GRADE_BUCKETS)}
+    mean = stats['sum'] / count
+    variance = max(stats['sum_sq'] / count - mean * mean, 0)
+    return {
+        'total_students': count,
+        'average_score': round(mean, 2),
+        'highest_score': stats['max'],
+        'lowest_score': stats['min'],
+        'pass_count': stats['pass_count'],
+        'fail_count': count - stats['pass_count'],
+        'pass_rate': round(stats['pass_count'] / count * 100, 2),
+        'std_dev': round(variance ** 0.5, 2),
+        'grade_labels': [label for label, _ in GRADE_BUCKETS],
+        'grade_counts': stats['buckets']
+    }
+
+def _db_update_analytics(conn, admin_id, entry=None):
+    # Fold one new entry into the stored aggregates, or rebuild them from all
+    # stored submissions when there is nothing to fold into
+    row = conn.execute('SELECT data FROM analytics WHERE admin_id = ?', (admin_id,)).fetchone()
+    if row is not None and entry is not None:
+        stats = json.loads(row['data'])
+        _add_to_analytics(stats, result_percentage(entry))
+    else:
+        rows = conn.execute('SELECT score, total FROM submissions WHERE admin_id = ?', (admin_id,))
+        stats = compute_analytics(rows)
+    conn.execute('INSERT OR REPLACE INTO analytics (admin_id, data) VALUES (?, ?)', (admin_id, json.dumps(stats)))
+    return stats
+
+def _fold_submission_log(admin_id, stats):
+    # Fold the log lines past stats['log_offset'] in; returns whether any were
+    entries, stats['log_offset'] = read_submission_log_from(admin_id, stats.get('log_offset', 0))
+    for entry in entries:
+        _add_to_analytics(stats, result_percentage(entry))
+    return bool(entries)
+
+def _json_rebuild_analytics(admin_id):
+    # Caller holds admin_lock
+    stats = compute_analytics(_read_shard(admin_id, 'results.json', []))
+    _fold_submission_log(admin_id, stats)
+    _write_shard(admin_id, 'analytics.json', stats)
+    return stats
+
+def _json_update_analytics(admin_id, entry):
+    # Caller holds admin_lock and has just added entry to results.json
+    try:
+        stats = read_json(_shard_file(admin_id, 'analytics.json'))
+    except (FileNotFoundError, ValueError):
+        return _json_rebuild_analytics(admin_id)
+    _add_to_analytics(stats, result_percentage(entry))
+    _write_shard(admin_id, 'analytics.json', stats)
+    return stats
+
+def load_admin_analytics(admin_id):
+    if STORAGE_BACKEND == 'sqlite':
+        row = get_db().execute('SELECT data FROM analytics WHERE admin_id = ?', (admin_id,)).fetchone()
+        if row is not None:
+            return json.loads(row['data'])
+        conn = get_db()
+        with conn:
+            return _db_update_analytics(conn, admin_id)
+    # Submissions in the log are not folded in by add_answer, which would
+    # undo the log's batched fsyncs; they are folded here from log_offset on
+    try:
+        stats = _read_shard(admin_id, 'analytics.json', None)
+    except ValueError:
+        stats = None
+    if stats is not None and stats.get('log_offset', 0) == submission_log_size(admin_id):
+        return stats
+    with admin_lock(admin_id):
+        try:
+            stats = read_json(_shard_file(admin_id, 'analytics.json'))
+        except (FileNotFoundError, ValueError):
+            return _json_rebuild_analytics(admin_id)
+        if stats.get('log_offset', 0) > submission_log_size(admin_id):
+            return _json_rebuild_analytics(admin_id)
+        if _fold_submission_log(admin_id, stats):
+            # No fsync: a copy lost in a crash is folded again from the log
+            _write_shard(admin_id, 'analytics.json', stats, sync=False)
+    return stats
+
+def rebuild_analytics(admin_id):
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            return _db_update_analytics(conn, admin_id)
+    with admin_lock(admin_id):
+        return _json_rebuild_analytics(admin_id)
+
+@app.cli.command('rebuild-analytics')
+@click.argument('admin_ids', nargs=-1)
+def rebuild_analytics_command(admin_ids):
+    """Recompute the dashboard analytics from stored results."""
+    for admin_id in admin_ids or list(load_admins()):
+        stats = rebuild_analytics(admin_id)
+        print(f"✓ {admin_id}: {stats['count']} result(s)")
+
+
+# Keyset pagination over result summaries for the dashboard results API. The
+# cursor encodes the (sort key, tie-breaker) of the last row served, so pages
+# stay stable while new submissions arrive. SQLite answers each page with an
+# indexed query and breaks ties by row id; the JSON backend sorts the admin's
+# summaries in memory and breaks ties by position in the result list.
+RESULT_SORT_KEYS = {
+    'time': lambda s: s[4],
+    'score': lambda s: round((s[2] / s[3]) * 100, 2) if s[3] > 0 else 0,
+    'name': lambda s: _normalize(s[1])
+}
+
+def _encode_cursor(key, index):
+    return base64.urlsafe_b64encode(json.dumps([key, index]).encode('utf-8')).decode('ascii')
+
+RESULT_CURSOR_TYPES = {'time': (str,), 'score': (int, float), 'name': (str,)}
+
+def _decode_cursor(cursor, sort):
+    # (key, index) of a cursor issued for this sort, or None if it is
+    # malformed or its key cannot be compared with this sort's keys
+    try:
+        key, index = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        index = int(index)
+    except (ValueError, TypeError):
+        return None
+    if isinstance(key, bool) or not isinstance(key, RESULT_CURSOR_TYPES[sort]):
+        return None
+    return (key, index)
+
+def paginate_results(summaries, sort='time', order='asc', query='', cursor=None, limit=50):
+    # Raises ValueError for a cursor that does not belong to this sort
+    if sort not in RESULT_SORT_KEYS:
+        sort = 'time'
+    sort_key = RESULT_SORT_KEYS[sort]
+    position = None
+    if cursor:
+        position = _decode_cursor(cursor, sort)
+        if position is None:
+            raise ValueError('Invalid cursor.')
+    query = _normalize(query)
+    keyed = sorted((sort_key(s), i, s) for i, s in enumerate(summaries) if query in _normalize(s[1]))
+    keys = [(k, i) for k, i, _ in keyed]
+
+    if order == 'desc':
+        end = bisect.bisect_left(keys, position) if position else len(keyed)
+        page = [item for item in reversed(keyed[max(end - limit, 0):end])]
+        has_more = end - limit > 0
+    else:
+        start = bisect.bisect_right(keys, position) if position else 0
+        page = keyed[start:start + limit]
+        has_more = start + limit < len(keyed)
+
+    next_cursor = _encode_cursor(page[-1][0], page[-1][1]) if page and has_more else None
+    return [s for _, _, s in page], next_cursor, len(keyed)
+
+# Must match the expressions of the submissions_time/score/name indexes
+RESULT_SORT_SQL = {
+    'time': 'timestamp',
+    'score': 'CASE WHEN total > 0 THEN ROUND(score * 100.0 / total, 2) ELSE 0 END',
+    'name': 'LOWER(TRIM(student_name))'
+}
+
+def _db_result_page(admin_id, sort, order, query, cursor, limit):
+    if sort not in RESULT_SORT_SQL:
+        sort = 'time'
+    position = None
+    if cursor:
+        position = _decode_cursor(cursor, sort)
+        if position is None:
+            raise ValueError('Invalid cursor.')
+    conn = get_db()
+    where, params = 'admin_id = ?', [admin_id]
+    query = _normalize(query)
+    if query:
+        # Uses the name expression so the submissions_name index covers it
+        where += f" AND INSTR({RESULT_SORT_SQL['name']}, ?) > 0"
+        params.append(query)
+    total = conn.execute(f'SELECT COUNT(*) FROM submissions WHERE {where}', params).fetchone()[0]
+
+    key = RESULT_SORT_SQL[sort]
+    direction, compare = ('DESC', '<') if order == 'desc' else ('ASC', '>')
+    if position:
+        # Spelled out rather than as a row value so SQLite seeks the index
+        where += f' AND {key} {compare}= ? AND ({key} {compare} ? OR id {compare} ?)'
+        params.extend([position[0], position[0], position[1]])
+    rows = conn.execute(
+        f'SELECT id, {key} AS sort_key, student_name, score, total, timestamp FROM submissions '
+        f'WHERE {where} ORDER BY {key} {direction}, id {direction} LIMIT ?', params + [limit + 1]
+    ).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    page = [(str(row['id']), row['student_name'], row['score'], row['total'], row['timestamp']) for row in rows]
+    next_cursor = _encode_cursor(rows[-1]['sort_key'], rows[-1]['id']) if has_more else None
+    return page, next_cursor, total
+
+def load_result_page(admin_id, sort='time', order='asc', query='', cursor=None, limit=50):
+    # (summaries, next_cursor, total); raises ValueError for a bad cursor
+    if STORAGE_BACKEND == 'sqlite':
+        return _db_result_page(admin_id, sort, order, query, cursor, limit)
+    return paginate_results(load_admin_result_summaries(admin_id), sort=sort, order=order,
+                            query=query, cursor=cursor, limit=limit)
+
+
+# Per-admin helpers used by the routes: the SQLite backend answers these with
+# indexed queries, the JSON backend reads and writes only that admin's
+# directory. JSON read-modify-write cycles hold admin_lock so concurrent
+# gunicorn workers never drop each other's writes.
+def create_admin(username, admin):
+    # Returns False if the username is already taken
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            cur = conn.execute(
+                'INSERT OR IGNORE INTO admins (username, password, email, phone, created_at) VALUES (?, ?, ?, ?, ?)',
+                (username, admin.get('password', ''), admin.get('email'), admin.get('phone'), admin.get('created_at'))
+            )
+        return cur.rowcount > 0
+    with file_lock(ADMINS_FILE):
+        admins = read_json(ADMINS_FILE)
+        if username in admins:
+            return False
+        admins[username] = admin
+        save_admins(admins)
+    return True
+
+# Versioned question store. Questions carry a stable id, and every question
+# list an admin publishes is kept as an immutable snapshot named by a hash of
+# its content (the quiz version): data/<admin>/versions/<version>.json, or the
+# question_versions table. Draft saves are not snapshotted; submissions only
+# ever reference a published version, so that is all that has to be kept.
+# Submissions store only the quiz version and the chosen letter per question
+# id; expand_results() resolves the question text and answer key from the
+# snapshot for the results page, PDFs and exports.
+# The admin edits a draft (the current question list); publishing points
+# settings['published_version'] at the draft's version, and students are
+# served that snapshot until the next publish.
+QUIZ_VERSION_PATTERN = re.compile(r'[0-9a-f]{16}')
+
+def new_question_id():
+    return uuid.uuid4().hex[:12]
+
+def _with_question_ids(questions):
+    return [q if q.get('id') else dict(q, id=new_question_id()) for q in questions]
+
+def quiz_version(questions):
+    payload = json.dumps(questions, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def _quiz_version_path(admin_id, version):
+    return os.path.join(admin_dir(admin_id), 'versions', version + '.json')
+
+def _db_store_quiz_version(conn, admin_id, questions):
+    version = quiz_version(questions)
+    conn.execute(
+        'INSERT OR IGNORE INTO question_versions (admin_id, version, questions, created_at) VALUES (?, ?, ?, ?)',
+        (admin_id, version, json.dumps(questions), datetime.now().isoformat())
+    )
+    return version
+
+def _json_store_quiz_version(admin_id, questions):
+    # Call with the admin lock held
+    version = quiz_version(questions)
+    path = _quiz_version_path(admin_id, version)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_json_atomic(path, {'version': version, 'created_at': datetime.now().isoformat(), 'questions': questions})
+    return version
+
+def _json_quiz_versions(admin_id):
+    directory = os.path.join(admin_dir(admin_id), 'versions')
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [read_json(os.path.join(directory, name)) for name in names if name.endswith('.json')]
+
+_quiz_version_cache = {}  # (admin_id, version) -> questions; snapshots never change
+
+def load_quiz_version(admin_id, version):
+    # Questions of a quiz version (read-only), or None if unknown
+    if not QUIZ_VERSION_PATTERN.fullmatch(version or ''):
+        return None
+    key = (admin_id, version)
+    questions = _quiz_version_cache.get(key)
+    if questions is None:
+        if STORAGE_BACKEND == 'sqlite':
+            row = get_db().execute(
+                'SELECT questions FROM question_versions WHERE admin_id = ? AND version = ?', (admin_id, version)
+            ).fetchone()
+            if row is None:
+                return None
+            questions = json.loads(row['questions'])
+        else:
+            try:
+                questions = read_json(_quiz_version_path(admin_id, version))['questions']
+            except FileNotFoundError:
+                return None
+        _quiz_version_cache[key] = questions
+    return questions
+
+def ensure_quiz_version(admin_id, questions):
+    # Quiz version of the admin's current questions, storing the snapshot if
+    # this list has not been published before
+    version = quiz_version(questions)
+    if load_quiz_version(admin_id, version) is None:
+        if STORAGE_BACKEND == 'sqlite':
+            conn = get_db()
+            with conn:
+                _db_store_quiz_version(conn, admin_id, questions)
+        else:
+            with admin_lock(admin_id):
+                _json_store_quiz_version(admin_id, questions)
+    return version
+
+def publish_quiz(admin_id):
+    # Freeze the current questions as the version students take; None if empty
+    with admin_lock(admin_id):
+        questions = load_admin_questions(admin_id)
+        if not questions:
+            return None
+        version = ensure_quiz_version(admin_id, questions)
+        update_admin_settings(admin_id, published_version=version)
+    return version
+
+def load_published_quiz(admin_id):
+    # (version, questions) served to students, or (None, []) if never published
+    version = load_admin_settings(admin_id).get('published_version')
+    questions = load_quiz_version(admin_id, version) if version else None
+    if questions is None:
+        return None, []
+    return version, questions
+
+def expand_results(admin_id, entries):
+    # Entries with the per-question 'results' list filled in from their quiz
+    # version; results stored before quiz versions existed already carry it
+    expanded = []
+    for entry in entries:
+        if 'results' in entry:
+            expanded.append(entry)
+            continue
+        questions = load_quiz_version(admin_id, entry['quiz_version']) or []
+        answers = entry['answers']
+        results = []
+        for q in questions:
+            user_answer = answers.get(q['id'])
+            results.append({
+                'question': q['question'],
+                'user_answer': user_answer,
+                'correct_answer': q['correct_answer'],
+                'correct': user_answer == q['correct_answer']
+            })
+        expanded.append(dict(entry, results=results))
+    return expanded
+
+def expand_result(admin_id, entry):
+    return expand_results(admin_id, [entry])[0]
+
+def load_admin_questions(admin_id):
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute('SELECT * FROM questions WHERE admin_id = ? ORDER BY position', (admin_id,))
+        return [_db_question(row) for row in rows]
+    return _read_shard(admin_id, 'questions.json', [])
+
+def save_admin_questions(admin_id, questions):
+    questions = _with_question_ids(questions)
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            _db_write_questions(conn, admin_id, questions)
+        return
+    with admin_lock(admin_id):
+        _write_shard(admin_id, 'questions.json', questions)
+
+def add_admin_question(admin_id, question):
+    with admin_lock(admin_id):
+        admin_questions = list(load_admin_questions(admin_id))
+        admin_questions.append(dict(question, id=new_question_id()))
+        save_admin_questions(admin_id, admin_questions)
+
+def delete_admin_question(admin_id, question_id):
+    with admin_lock(admin_id):
+        admin_questions = load_admin_questions(admin_id)
+        remaining = [q for q in admin_questions if q['id'] != question_id]
+        if len(remaining) != len(admin_questions):
+            save_admin_questions(admin_id, remaining)
+
+# Rosters (JSON backend) are sharded like the eligibility index: the rows of
+# data/<admin>/roster/<prefix>.json share a hash prefix of the normalized
+# student ID, so an upload rewrites only the files of the IDs it changes. Each
+# row keeps the sequence number it was added with (the next one is in
+# roster/meta.json), and the roster lists in that order.
+ROSTER_META_FILE = os.path.join('roster', 'meta.json')
+
+def _roster_bucket(student_id):
+    return hashlib.sha256(_normalize(student_id).encode('utf-8')).hexdigest()[:2]
+
+def _roster_bucket_file(bucket):
+    return os.path.join('roster', bucket + '.json')
+
+def _roster_buckets(admin_id):
+    try:
+        names = os.listdir(_shard_file(admin_id, 'roster'))
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-5] for name in names if name.endswith('.json') and name != 'meta.json')
+
+def roster_shard_files(students):
+    # {file name under the admin directory: data} for a new sharded roster
+    files = {}
+    for seq, student in enumerate(students):
+        files.setdefault(_roster_bucket_file(_roster_bucket(student.get('student_id'))), []).append(dict(student, seq=seq))
+    files[ROSTER_META_FILE] = {'next_seq': len(students)}
+    return files
+
+def load_admin_allowed(admin_id):
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute('SELECT name, student_id FROM roster WHERE admin_id = ? ORDER BY id', (admin_id,))
+        return [{'name': row['name'], 'student_id': row['student_id']} for row in rows]
+    return _json_load_allowed(admin_id)
+
+def _json_load_allowed(admin_id):
+    rows = []
+    for bucket in _roster_buckets(admin_id):
+        rows.extend(_read_shard(admin_id, _roster_bucket_file(bucket), []))
+    rows.sort(key=lambda s: s['seq'])
+    return [{'name': s.get('name'), 'student_id': s.get('student_id')} for s in rows]
+
+# Roster changes: an upload can replace the roster, add students (updating
+# the name of IDs already listed) or remove the listed IDs. Only the delta is
+# written: SQLite diffs a replacement against the roster in SQL and finds the
+# students of other uploads via the roster_student index; JSON rewrites the
+# roster files and eligibility index buckets of the changed students.
+ROSTER_MODES = ('replace', 'add', 'remove')
+
+def merge_roster(current, incoming, mode):
+    # (kept rows, changes) for applying incoming to current; the new roster is
+    # the kept rows plus changes['added']. Outside 'replace', current may be
+    # just the rows whose IDs appear in incoming.
+    incoming_by_id = {_normalize(s['student_id']): s for s in incoming}
+    changes = {'added': [], 'updated': [], 'removed': [], 'unchanged': 0}
+    kept = []
+    matched = set()
+    updated_ids = set()
+    for s in current:
+        sid = _normalize(s.get('student_id'))
+        new = incoming_by_id.get(sid)
+        if new is None:
+            if mode == 'replace':
+                changes['removed'].append(s)
+                continue
+        elif mode == 'remove' or (mode == 'replace' and sid in matched):  # or a duplicate ID from older uploads
+            changes['removed'].append(s)
+            matched.add(sid)
+            continue
+        else:
+            matched.add(sid)
+            if new['name'] != s.get('name'):
+                renamed = dict(s, name=new['name'])
+                changes['updated'].append((s, renamed))
+                updated_ids.add(sid)
+                s = renamed
+        kept.append(s)
+    if mode == 'remove':
+        changes['unchanged'] = len(incoming_by_id) - len(matched)
+    else:
+        changes['added'] = [s for sid, s in incoming_by_id.items() if sid not in matched]
+        changes['unchanged'] = len(matched) - len(updated_ids)
+    return kept, changes
+
+def roster_change_summary(changes):
+    return {
+        'added': len(changes['added']),
+        'updated': len(changes['updated']),
+        'removed': len(changes['removed']),
+        'unchanged': changes['unchanged']
+    }
+
+def _db_roster_rows(conn, admin_id, students):
+    # The admin's roster rows for the uploaded student IDs
+    sids = sorted({_normalize(s['student_id']) for s in students})
+    rows = []
+    for start in range(0, len(sids), 500):
+        chunk = sids[start:start + 500]
+        rows.extend(conn.execute(
+            f"SELECT id, name, student_id FROM roster WHERE admin_id = ? AND sid_norm IN ({', '.join('?' * len(chunk))})",
+            [admin_id] + chunk
+        ))
+    rows.sort(key=lambda row: row['id'])
+    return rows
+
+def _db_replace_allowed(conn, admin_id, students):
+    # Diff the upload against the roster in SQL: rows whose ID is gone (or
+    # repeats an earlier row's ID) are deleted, renamed IDs updated and new
+    # IDs inserted. Returns the change counts.
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS roster_upload '
+                 '(sid_norm TEXT PRIMARY KEY, name TEXT, student_id TEXT, name_norm TEXT)')
+    conn.execute('DELETE FROM temp.roster_upload')
+    conn.executemany(
+        'INSERT OR REPLACE INTO temp.roster_upload (sid_norm, name, student_id, name_norm) VALUES (?, ?, ?, ?)',
+        [(_normalize(s['student_id']), s.get('name') or '', s.get('student_id') or '', _normalize(s.get('name')))
+         for s in students]
+    )
+    uploaded = conn.execute('SELECT COUNT(*) FROM temp.roster_upload').fetchone()[0]
+    removed = conn.execute(
+        'DELETE FROM roster WHERE admin_id = ? AND ('
+        'sid_norm NOT IN (SELECT sid_norm FROM temp.roster_upload) OR '
+        'EXISTS (SELECT 1 FROM roster AS earlier WHERE earlier.admin_id = roster.admin_id '
+        'AND earlier.sid_norm = roster.sid_norm AND earlier.id < roster.id))',
+        (admin_id,)
+    ).rowcount
+    updated = conn.execute(
+        'UPDATE roster SET name = u.name, name_norm = u.name_norm FROM temp.roster_upload AS u '
+        'WHERE roster.admin_id = ? AND roster.sid_norm = u.sid_norm AND roster.name != u.name',
+        (admin_id,)
+    ).rowcount
+    added = conn.execute(
+        'INSERT INTO roster (admin_id, name, student_id, name_norm, sid_norm) '
+        'SELECT ?, u.name, u.student_id, u.name_norm, u.sid_norm FROM temp.roster_upload AS u '
+        'WHERE NOT EXISTS (SELECT 1 FROM roster WHERE admin_id = ? AND sid_norm = u.sid_norm) ORDER BY u.rowid',
+        (admin_id, admin_id)
+    ).rowcount
+    conn.execute('DELETE FROM temp.roster_upload')
+    return {'added': added, 'updated': updated, 'removed': removed, 'unchanged': uploaded - added - updated}
+
+def update_admin_allowed(admin_id, students, mode='replace'):
+    # Apply an uploaded roster with the given mode; returns the change counts
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if mode == 'replace':
+                return _db_replace_allowed(conn, admin_id, students)
+            current = [{'id': row['id'], 'name': row['name'], 'student_id': row['student_id']}
+                       for row in _db_roster_rows(conn, admin_id, students)]
+            _, changes = merge_roster(current, students, mode)
+            conn.executemany('DELETE FROM roster WHERE id = ?', [(s['id'],) for s in changes['removed']])
+            conn.executemany('UPDATE roster SET name = ?, name_norm = ? WHERE id = ?',
+                             [(new['name'], _normalize(new['name']), old['id']) for old, new in changes['updated']])
+            _db_insert_allowed(conn, admin_id, changes['added'])
+        return roster_change_summary(changes)
+    total = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+    with admin_lock(admin_id):
+        try:
+            next_seq = read_json(_shard_file(admin_id, ROSTER_META_FILE))['next_seq']
+        except FileNotFoundError:
+            next_seq = 0
+        # Numbered in upload order; only the added ones are stored
+        incoming = {}
+        for seq, student in enumerate(students, next_seq):
+            incoming.setdefault(_roster_bucket(student['student_id']), []).append(dict(student, seq=seq))
+        buckets = set(incoming)
+        if mode == 'replace':
+            buckets.update(_roster_buckets(admin_id))
+        old_keys, new_keys = set(), set()
+        for bucket in sorted(buckets):
+            name = _roster_bucket_file(bucket)
+            try:
+                current = read_json(_shard_file(admin_id, name))
+            except FileNotFoundError:
+                current = []
+            kept, changes = merge_roster(current, incoming.get(bucket, []), mode)
+            for key in total:
+                total[key] += changes[key] if key == 'unchanged' else len(changes[key])
+            if not (changes['added'] or changes['updated'] or changes['removed']):
+                continue
+            roster = kept + changes['added']
+            if roster:
+                _write_shard(admin_id, name, roster)
+            else:
+                os.remove(_shard_file(admin_id, name))
+            # A student key lives in its ID's bucket, so diffing the changed
+            # buckets also handles dropped duplicate rows
+            old_keys.update(_student_key(s.get('name'), s.get('student_id')) for s in current)
+            new_keys.update(_student_key(s.get('name'), s.get('student_id')) for s in roster)
+        if total['added']:
+            _write_shard(admin_id, ROSTER_META_FILE, {'next_seq': next_seq + len(students)})
+        apply_roster_index_delta(admin_id, old_keys - new_keys, new_keys - old_keys)
+    return total
+
+def is_student_allowed(admin_id, student_name, student_id):
+    name_norm = _normalize(student_name)
+    id_norm = _normalize(student_id)
+    if STORAGE_BACKEND == 'sqlite':
+        row = get_db().execute(
+            'SELECT 1 FROM roster WHERE name_norm = ? AND sid_norm = ? AND admin_id = ? LIMIT 1',
+            (name_norm, id_norm, admin_id)
+        ).fetchone()
+        return row is not None
+    return admin_id in roster_index_admins(_student_key(student_name, student_id))
+
+def find_allowed_admins(student_name, student_id):
+    name_norm = _normalize(student_name)
+    id_norm = _normalize(student_id)
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute(
+            'SELECT DISTINCT admin_id FROM roster WHERE name_norm = ? AND sid_norm = ?', (name_norm, id_norm)
+        )
+        return [row['admin_id'] for row in rows]
+    return list(roster_index_admins(_student_key(student_name, student_id)))
+
+# Roster import. Uploads are parsed row by row (csv over the spooled upload,
+# openpyxl read-only for XLSX), so only the deduplicated students are held in
+# memory; the result is applied with a single update_admin_allowed().
+ROSTER_ERROR_LIMIT = 20  # per-row errors reported back to the admin
+
+def iter_upload_rows(stream, filename):
+    # (row number, [cell strings]) for every row of an uploaded CSV or XLSX file
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            for row_num, row in enumerate(wb.active.iter_rows(values_only=True), start=1):
+                yield row_num, [_upload_cell(value) for value in row]
+        finally:
+            wb.close()
+        return
+    text = TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    first_line = text.readline()
+    # Detect delimiter: check first line for tabs or commas
+    delimiter = '\t' if '\t' in first_line else ','
+    for row_num, row in enumerate(csv.reader(itertools.chain([first_line], text), delimiter=delimiter), start=1):
+        yield row_num, [cell.strip() for cell in row]
+
+def _upload_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # numeric IDs come back from Excel as floats
+    return str(value).strip()
+
+def _roster_columns(headers):
+    # Find column indices for name and student_id
+    headers_lower = [h.lower() for h in headers]
+    name_col = None
+    sid_col = None
+    for i, h in enumerate(headers_lower):
+        if 'name' in h or 'student' in h:
+            if 'id' not in h:
+                name_col = i
+        if 'id' in h or 'studentid' in h or 'reg' in h:
+            sid_col = i
+    # Fallback: assume first column is name, second is ID
+    if name_col is None:
+        name_col = 0
+    if sid_col is None:
+        sid_col = 1 if len(headers) > 1 else None
+    return name_col, sid_col
+
+def parse_roster(rows, require_name=True):
+    # Students deduplicated on normalized student_id, plus a report of the
+    # rows that were skipped and why
+    students = []
+    seen = {}  # normalized student_id -> row number
+    errors = []
+    error_count = 0
+    name_col = sid_col = None
+    for row_num, row in rows:
+        if not any(row):
+            continue
+        if name_col is None:
+            name_col, sid_col = _roster_columns(row)
+            continue
+        name = row[name_col] if name_col < len(row) else ''
+        sid = row[sid_col] if sid_col is not None and sid_col < len(row) else ''
+        if not sid or (require_name and not name):
+            error = 'missing student ID' if not sid else 'missing name'
+        elif _normalize(sid) in seen:
+            error = f'duplicate student ID {sid} (first on row {seen[_normalize(sid)]})'
+        else:
+            seen[_normalize(sid)] = row_num
+            students.append({'name': name, 'student_id': sid})
+            continue
+        error_count += 1
+        if len(errors) < ROSTER_ERROR_LIMIT:
+            errors.append(f'Row {row_num}: {error}')
+    return {'students': students, 'errors': errors, 'error_count': error_count, 'has_headers': name_col is not None}
+
+# Question bank import/export. CSV and XLSX use one row per question with
+# the QUESTION_COLUMNS headers; JSON is a list of question objects as stored.
+# An import is validated completely and then saved with one
+# save_admin_questions(), so a bank becomes one quiz version, not hundreds.
+QUESTION_COLUMNS = ('id', 'question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer')
+QUESTION_HEADER_ALIASES = {'a': 'option_a', 'b': 'option_b', 'c': 'option_c', 'd': 'option_d',
+                           'answer': 'correct_answer', 'correct': 'correct_answer', 'question_text': 'question'}
+QUESTION_ID_PATTERN = re.compile(r'[0-9A-Za-z_-]{1,64}')
+QUESTION_EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'json': 'application/json'
+}
+
+def iter_question_records(stream, filename):
+    # (row number, {column: value}) for every question in an upload
+    if filename.lower().endswith('.json'):
+        items = json.load(TextIOWrapper(stream, encoding='utf-8-sig'))
+        if not isinstance(items, list):
+            raise ValueError('JSON file must contain a list of questions')
+        for number, item in enumerate(items, start=1):
+            if not isinstance(item, dict):
+                yield number, {}
+                continue
+            record = {key: item.get(key) for key in QUESTION_COLUMNS}
+            options = item.get('options')
+            if isinstance(options, dict):
+                for letter in 'ABCD':
+                    record['option_' + letter.lower()] = options.get(letter)
+            yield number, {key: _upload_cell(value) for key, value in record.items()}
+        return
+    columns = None
+    for row_num, row in iter_upload_rows(stream, filename):
+        if not any(row):
+            continue
+        if columns is None:
+            columns = []
+            for header in row:
+                header = header.lower().replace(' ', '_')
+                columns.append(QUESTION_HEADER_ALIASES.get(header, header))
+            missing = [c for c in QUESTION_COLUMNS[1:] if c not in columns]
+            if missing:
+                raise ValueError(f"missing column(s) {', '.join(missing)}")
+            continue
+        yield row_num, dict(zip(columns, row))
+
+def parse_questions(records):
+    # Validated questions plus per-row errors; ids repeated in the upload are errors
+    questions = []
+    errors = []
+    error_count = 0
+    seen_ids = set()
+    for row_num, record in records:
+        question = {
+            'question': record.get('question') or '',
+            'options': {letter: record.get('option_' + letter.lower()) or '' for letter in 'ABCD'},
+            'correct_answer': (record.get('correct_answer') or '').upper()
+        }
+        question_id = record.get('id') or ''
+        if not question['question']:
+            error = 'missing question text'
+        elif not all(question['options'].values()):
+            error = 'options A-D are all required'
+        elif question['correct_answer'] not in question['options']:
+            error = 'correct_answer must be A, B, C or D'
+        elif question_id and not QUESTION_ID_PATTERN.fullmatch(question_id):
+            error = f'invalid id {question_id}'
+        elif question_id in seen_ids:
+            error = f'duplicate id {question_id}'
+        else:
+            if question_id:
+                question['id'] = question_id
+                seen_ids.add(question_id)
+            questions.append(question)
+            continue
+        error_count += 1
+        if len(errors) < ROSTER_ERROR_LIMIT:
+            errors.append(f'Row {row_num}: {error}')
+    return {'questions': questions, 'errors': errors, 'error_count': error_count}
+
+def import_admin_questions(admin_id, questions, mode='append'):
+    # Add (or with mode 'replace', swap in) a bank of questions in one write.
+    # Imported questions whose id matches an existing one update it in place.
+    with admin_lock(admin_id):
+        current = [] if mode == 'replace' else load_admin_questions(admin_id)
+        incoming = {q['id']: q for q in questions if 'id' in q}
+        merged = [incoming.pop(q['id'], q) for q in current]
+        updated = sum(1 for q, m in zip(current, merged) if m != q)
+        added = [q for q in questions if 'id' not in q or q['id'] in incoming]
+        save_admin_questions(admin_id, merged + added)
+    return {'added': len(added), 'updated': updated}
+
+def export_admin_questions(admin_id, fmt):
+    # The admin's questions as a CSV, XLSX or JSON file object
+    questions = load_admin_questions(admin_id)
+    rows = [[q['id'], q['question'], *(q['options'].get(letter, '') for letter in 'ABCD'), q['correct_answer']]
+            for q in questions]
+    output = BytesIO()
+    if fmt == 'json':
+        output.write(json.dumps(questions, indent=2, ensure_ascii=False).encode('utf-8'))
+    elif fmt == 'xlsx':
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet('Questions')
+        ws.append(QUESTION_COLUMNS)
+        for row in rows:
+            ws.append(row)
+        wb.save(output)
+    else:
+        text = TextIOWrapper(output, encoding='utf-8-sig', newline='', write_through=True)
+        writer = csv.writer(text)
+        writer.writerow(QUESTION_COLUMNS)
+        writer.writerows(rows)
+        text.detach()
+    output.seek(0)
+    return output
+
+def load_admin_settings(admin_id):
+    if STORAGE_BACKEND == 'sqlite':
+        row = get_db().execute('SELECT data FROM settings WHERE admin_id = ?', (admin_id,)).fetchone()
+        return json.loads(row['data']) if row else {'time_limit': 0}
+    return _read_shard(admin_id, 'settings.json', {'time_limit': 0})
+
+def save_admin_settings(admin_id, settings):
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            _db_write_settings(conn, admin_id, settings)
+        return
+    with admin_lock(admin_id):
+        _write_shard(admin_id, 'settings.json', settings)
+
+def update_admin_settings(admin_id, **changes):
+    with admin_lock(admin_id):
+        settings = dict(load_admin_settings(admin_id))
+        settings.update(changes)
+        settings['updated_at'] = datetime.now().isoformat()  # Last-Modified of the quiz payload
+        save_admin_settings(admin_id, settings)
+
+def load_admin_answers(admin_id):
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute('SELECT * FROM submissions WHERE admin_id = ? ORDER BY id', (admin_id,))
+        return [_db_answer(row) for row in rows]
+    # Results stored before the log was enabled come first
+    return _read_shard(admin_id, 'results.json', []) + read_submission_log(admin_id)
+
+def iter_admin_answers(admin_id):
+    # Like load_admin_answers, but one result at a time for exports: SQLite
+    # rows are fetched and results.json and the log are parsed as the caller
+    # iterates
+    if STORAGE_BACKEND == 'sqlite':
+        for row in get_db().execute('SELECT * FROM submissions WHERE admin_id = ? ORDER BY id', (admin_id,)):
+            yield _db_answer(row)
+        return
+    try:
+        yield from iter_json_array(_shard_file(admin_id, 'results.json'))
+    except FileNotFoundError:
+        pass
+    yield from iter_submission_log(admin_id)
+
+def iter_admin_result_summaries(admin_id):
+    # (result id, student_name, score, total, timestamp) per result, without
+    # the per-question detail. SQLite rows are fetched as the caller iterates.
+    if STORAGE_BACKEND == 'sqlite':
+        rows = get_db().execute(
+            'SELECT id, student_name, score, total, timestamp FROM submissions WHERE admin_id = ? ORDER BY id', (admin_id,)
+        )
+        for row in rows:
+            yield (str(row['id']), row['student_name'], row['score'], row['total'], row['timestamp'])
+        return
+    for e in iter_admin_answers(admin_id):
+        yield (e['id'], e['student_name'], e['score'], e['total'], e['timestamp'])
+
+def load_admin_result_summaries(admin_id):
+    return list(iter_admin_result_summaries(admin_id))
+
+def longest_student_name(admin_id):
+    if STORAGE_BACKEND == 'sqlite':
+        return get_db().execute(
+            'SELECT COALESCE(MAX(LENGTH(student_name)), 0) FROM submissions WHERE admin_id = ?', (admin_id,)
+        ).fetchone()[0]
+    return max((len(e['student_name']) for e in iter_admin_answers(admin_id)), default=0)
+
+def count_submitters(admin_id):
+    if STORAGE_BACKEND == 'sqlite':
+        return get_db().execute('SELECT COUNT(*) FROM submitters WHERE admin_id = ?', (admin_id,)).fetchone()[0]
+    return len(load_submitter_keys(admin_id))
+
+def load_admin_answer(admin_id, result_id):
+    # Single result by its result id, or None
+    if STORAGE_BACKEND == 'sqlite':
+        if not result_id.isdigit():
+            return None
+        row = get_db().execute(
+            'SELECT * FROM submissions WHERE admin_id = ? AND id = ?', (admin_id, int(result_id))
+        ).fetchone()
+        return _db_answer(row) if row else None
+    return next((e for e in iter_admin_answers(admin_id) if e['id'] == result_id), None)
+
+def new_result_id():
+    # JSON results carry their own id; SQLite uses the submission's row id
+    return uuid.uuid4().hex[:16]
+
+def add_answer(admin_id, entry):
+    # Store a submission unless this student already submitted this quiz.
+    # The duplicate check and the write are one atomic step; returns False
+    # for a duplicate.
+    lookup_keys = _submitter_lookup_keys(entry.get('student_name'), entry.get('student_id'))
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            # Take the write lock up front so no other worker can slip in between check and insert
+            conn.execute('BEGIN IMMEDIATE')
+            if _db_has_submitter(conn, admin_id, lookup_keys):
+                return False
+            _db_insert_answers(conn, admin_id, [entry])
+            _db_update_analytics(conn, admin_id, entry)
+        return True
+    with admin_lock(admin_id):
+        keys = load_submitter_keys(admin_id)
+        if any(key in keys for key in lookup_keys):
+            return False
+        entry = dict(entry, id=new_result_id())
+        os.makedirs(admin_dir(admin_id), exist_ok=True)
+        size = _append_submitter_key(admin_id, _submitter_key(entry))
+        try:
+            if SUBMISSION_LOG:
+                append_submission_log(admin_id, entry)
+            else:
+                try:
+                    admin_answers = read_json(_shard_file(admin_id, 'results.json'))
+                except FileNotFoundError:
+                    admin_answers = []
+                admin_answers.append(entry)
+                _write_shard(admin_id, 'results.json', admin_answers)
+        except Exception:
+            _truncate_submitter_keys(admin_id, size)
+            raise
+        if not SUBMISSION_LOG:
+            _json_update_analytics(admin_id, entry)
+    return True
+
+def _db_has_submitter(conn, admin_id, keys):
+    row = conn.execute(
+        f"SELECT 1 FROM submitters WHERE admin_id = ? AND key IN ({', '.join('?' * len(keys))}) LIMIT 1",
+        [admin_id] + keys
+    ).fetchone()
+    return row is not None
+
+def has_submitted(admin_id, student_name, student_id):
+    lookup_keys = _submitter_lookup_keys(student_name, student_id)
+    if STORAGE_BACKEND == 'sqlite':
+        return _db_has_submitter(get_db(), admin_id, lookup_keys)
+    keys = load_submitter_keys(admin_id)
+    return any(key in keys for key in lookup_keys)
+
+def clear_admin_answers(admin_id):
+    # Returns False when the admin had no results stored at all
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            cur = conn.execute('DELETE FROM submissions WHERE admin_id = ?', (admin_id,))
+            conn.execute('DELETE FROM submitters WHERE admin_id = ?', (admin_id,))
+            conn.execute('DELETE FROM analytics WHERE admin_id = ?', (admin_id,))
+        return cur.rowcount > 0
+    with admin_lock(admin_id):
+        _remove_submitter_keys(admin_id)
+        _write_shard(admin_id, 'analytics.json', _empty_analytics())
+        had_log = remove_submission_log(admin_id)
+        if not os.path.exists(_shard_file(admin_id, 'results.json')):
+            return had_log
+        _write_shard(admin_id, 'results.json', [])
+    return True
+
+def delete_admins(admin_ids, only_if_empty=False):
+    # Remove admin accounts together with their questions, roster, settings
+    # and results: one write of admins.json and of the roster index for the
+    # whole batch. only_if_empty skips admins that have questions by the time
+    # their locks are held. Returns the deleted admin ids.
+    admin_ids = list(dict.fromkeys(admin_ids))
+    if not admin_ids:
+        return []
+    if STORAGE_BACKEND == 'sqlite':
+        conn = get_db()
+        with conn:
+            if only_if_empty:
+                admin_ids = [admin_id for admin_id in admin_ids if conn.execute(
+                    'DELETE FROM admins WHERE username = ? AND NOT EXISTS (SELECT 1 FROM questions WHERE admin_id = ?)',
+                    (admin_id, admin_id)).rowcount]
+            else:
+                conn.executemany('DELETE FROM admins WHERE username = ?', [(a,) for a in admin_ids])
+            for table in ('questions', 'question_versions', 'roster', 'settings', 'submissions', 'submitters', 'analytics'):
+                conn.executemany(f'DELETE FROM {table} WHERE admin_id = ?', [(a,) for a in admin_ids])
+        return admin_ids
+
+    with ExitStack() as stack:
+        # Take the admin locks in stripe order so concurrent batches cannot deadlock
+        for admin_id in sorted(admin_ids, key=_admin_stripe):
+            stack.enter_context(admin_lock(admin_id))
+        if only_if_empty:
+            admin_ids = [admin_id for admin_id in admin_ids if not load_admin_questions(admin_id)]
+            if not admin_ids:
+                return []
+        with file_lock(ADMINS_FILE):
+            admins = read_json(ADMINS_FILE)
+            for admin_id in admin_ids:
+                admins.pop(admin_id, None)
+            save_admins(admins)
+        # Rename first so readers never see a half-deleted directory
+        tombstones = []
+        for admin_id in admin_ids:
+            tombstone = os.path.join(DATA_DIR, f'.deleted-{os.getpid()}-{admin_filename(admin_id)}')
+            try:
+                os.rename(admin_dir(admin_id), tombstone)
+            except FileNotFoundError:
+                continue
+            tombstones.append(tombstone)
+        drop_admins_from_roster_index(admin_ids)
+    for tombstone in tombstones:
+        shutil.rmtree(tombstone, ignore_errors=True)
+    return admin_ids
+
+# Item analysis for one quiz version: the chosen letters of every submission
+# are packed into a dense students x questions uint8 matrix, and difficulty,
+# upper/lower 27% discrimination, point-biserial (item vs rest of the test),
+# option counts and KR-20 are computed over it with NumPy. Results stored
+# before quiz versions existed carry no answer letters and are left out.
+ITEM_OPTIONS = 'ABCD'
+ITEM_LETTERS = frozenset(ITEM_OPTIONS)
+ITEM_GROUP_FRACTION = 0.27
+
+ITEM_BLOCK_ROWS = 4096  # students per block when weighting the matrix by total score
+
+def _db_version_counts(conn, admin_id):
+    # {quiz version: number of submissions}
+    rows = conn.execute(
+        'SELECT quiz_version, COUNT(*) AS n FROM submissions WHERE admin_id = ? AND quiz_version IS NOT NULL '
+        'GROUP BY quiz_version', (admin_id,)
+    )
+    return {row['quiz_version']: row['n'] for row in rows}
+
+def _db_version_answers(conn, admin_id, version):
+    # {question id: letter} of every submission made against version
+    rows = conn.execute(
+        'SELECT answers FROM submissions WHERE admin_id = ? AND quiz_version = ? ORDER BY id', (admin_id, version)
+    )
+    for row in rows:
+        yield json.loads(row['answers'])
+
+def _json_version_answer_rows(admin_id, version=None):
+    # ({quiz version: number of submissions}, {quiz version: answer rows}) in
+    # one streamed pass over the stored results. The rows of a version are
+    # packed into one bytearray, a byte per answer, and kept for version
+    # only, or for every version when it is None.
+    counts, rows, question_ids = {}, {}, {}
+    for entry in iter_admin_answers(admin_id):
+        entry_version = entry.get('quiz_version')
+        if entry_version is None:
+            continue
+        counts[entry_version] = counts.get(entry_version, 0) + 1
+        if version is not None and entry_version != version:
+            continue
+        if entry_version not in question_ids:
+            questions = load_quiz_version(admin_id, entry_version)
+            question_ids[entry_version] = [q['id'] for q in questions] if questions else None
+        if question_ids[entry_version]:
+            rows.setdefault(entry_version, bytearray()).extend(answer_row(entry.get('answers'), question_ids[entry_version]))
+    return counts, rows
+
+def answer_row(answers, question_ids):
+    # Chosen option letters of one submission as bytes, b'-' where unanswered
+    # or where the stored answer is not a single option letter (None, numbers, ...)
+    answers = answers if isinstance(answers, dict) else {}
+    try:
+        row = ''.join(map(answers.get, question_ids, itertools.repeat('-')))
+    except TypeError:  # a stored answer that isn't a string
+        row = ''
+    if len(row) != len(question_ids):
+        row = ''.join(['-' if not isinstance(value, str) or value not in ITEM_LETTERS else value
+                       for value in map(answers.get, question_ids)])
+    return row.encode('ascii', 'replace')
+
+def answer_matrix(rows, items):
+    # Packed answer rows as a (students x questions) uint8 array of letters, b'-' where unanswered
+    matrix = np.frombuffer(rows, dtype=np.uint8).reshape(-1, items)
+    valid = np.frombuffer((ITEM_OPTIONS + '-').encode('ascii'), dtype=np.uint8)
+    return np.where(np.isin(matrix, valid), matrix, ord('-')).astype(np.uint8)
+
+def item_statistics(choices, key):
+    # Per-item and test statistics for a choices matrix and answer-key letters
+    students, items = choices.shape
+    correct = choices == np.frombuffer(key.encode('ascii'), dtype=np.uint8)
+    totals = correct.sum(axis=1, dtype=np.float64)
+    difficulty = correct.mean(axis=0, dtype=np.float64)
+
+    group = max(1, int(round(students * ITEM_GROUP_FRACTION)))
+    order = np.argsort(totals, kind='stable')
+    discrimination = (correct[order[-group:]].mean(axis=0, dtype=np.float64)
+                      - correct[order[:group]].mean(axis=0, dtype=np.float64))
+
+    # Item vs rest-of-test correlation from cov(item, total) without
+    # materializing the rest scores: cov(x, t - x) = cov(x, t) - var(x).
+    # totals @ correct runs over row blocks, so only one block of the bool
+    # matrix is ever cast to float.
+    weighted = np.zeros(items)
+    for start in range(0, students, ITEM_BLOCK_ROWS):
+        weighted += totals[start:start + ITEM_BLOCK_ROWS] @ correct[start:start + ITEM_BLOCK_ROWS]
+    item_var = difficulty * (1 - difficulty)
+    cov_total = weighted / students - difficulty * totals.mean()
+    total_var = totals.var()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        point_biserial = (cov_total - item_var) / np.sqrt(item_var * (total_var - 2 * cov_total + item_var))
+    kr20 = items / (items - 1) * (1 - item_var.sum() / total_var) if items > 1 and total_var > 0 else None
+
+    counts = np.stack([(choices == ord(option)).sum(axis=0) for option in ITEM_OPTIONS + '-'])
+    return {
+        'difficulty': difficulty,
+        'discrimination': discrimination,
+        'point_biserial': point_biserial,
+        'option_counts': counts,
+        'kr20': kr20,
+        'mean_score': float(totals.mean()),
+        'std_score': float(np.sqrt(total_var))
+    }
+
+def _item_stat(value):
+    return None if value is None or np.isnan(value) else round(float(value), 3)
+
+def item_analysis(admin_id, version=None):
+    # Item-analysis report for a quiz version; by default the published
+    # version, or the one with the most submissions
+    if STORAGE_BACKEND == 'sqlite':
+        counts, rows = _db_version_counts(get_db(), admin_id), None
+    else:
+        counts, rows = _json_version_answer_rows(admin_id, version)
+    published = load_admin_settings(admin_id).get('published_version')
+    if version is None:
+        version = published if published in counts else max(counts, key=counts.get, default=None)
+    report = {
+        'version': version,
+        'versions': [{'version': v, 'submissions': n, 'published': v == published}
+                     for v, n in sorted(counts.items(), key=lambda item: -item[1])],
+        'students': 0,
+        'kr20': None,
+        'mean_score': None,
+        'std_score': None,
+        'items': []
+    }
+    questions = load_quiz_version(admin_id, version) if version in counts else None
+    if not questions:
+        return report
+    question_ids = [q['id'] for q in questions]
+    if rows is None:
+        rows = b''.join(answer_row(answers, question_ids) for answers in _db_version_answers(get_db(), admin_id, version))
+    else:
+        rows = rows.get(version, b'')
+    choices = answer_matrix(rows, len(question_ids))
+    stats = item_statistics(choices, ''.join(q['correct_answer'] or '-' for q in questions))
+    report.update(students=len(choices), kr20=_item_stat(stats['kr20']),
+                  mean_score=_item_stat(stats['mean_score']), std_score=_item_stat(stats['std_score']))
+    for i, q in enumerate(questions):
+        option_counts = stats['option_counts'][:, i].tolist()
+        report['items'].append({
+            'id': q['id'],
+            'question': q['question'],
+            'correct_answer': q['correct_answer'],
+            'difficulty': _item_stat(stats['difficulty'][i]),
+            'discrimination': _item_stat(stats['discrimination'][i]),
+            'point_biserial': _item_stat(stats['point_biserial'][i]),
+            'options': dict(zip(list(ITEM_OPTIONS) + ['blank'], option_counts))
+        })
+    return report
+
+# Excel export: a write-only worksheet serializes each row as it is appended,
+# cells share a few named styles instead of carrying their own Font objects,
+# and the workbook is saved into a spooled temp file that only spills to disk
+# for large exports. Column widths must be known before the first row, so they
+# come from the fixed formats plus the longest student name.
+EXCEL_HEADERS = ['Student Name', 'Score', 'Total', 'Percentage', 'Grade', 'Date', 'Time']
+EXCEL_VALUE_WIDTHS = [0, 5, 5, 6, 1, 10, 8]  # widest formatted value per column
+EXCEL_SPOOL_SIZE = 8 * 1024 * 1024
+
+def _excel_named_styles():
+    header = NamedStyle(name='result_header')
+    header.fill = PatternFill(start_color="E74C3C", end_color="E74C3C", fill_type="solid")
+    header.font = Font(bold=True, color="FFFFFF", size=12)
+    header.alignment = Alignment(horizontal='center', vertical='center')
+    styles = [header]
+    # Color code based on grade
+    for name, grade_color in (('result_pass', "27AE60"), ('result_borderline', "F39C12"), ('result_fail', "E74C3C")):
+        style = NamedStyle(name=name)
+        style.font = Font(bold=True, color=grade_color)
+        styles.append(style)
+    return styles
+
+def _excel_grade(percentage):
+    grade = 'A' if percentage >= 70 else 'B' if percentage >= 60 else 'C' if percentage >= 50 else 'D' if percentage >= 40 else 'F'
+    if percentage >= 70:
+        return grade, 'result_pass'
+    if percentage >= 50:
+        return grade, 'result_borderline'
+    return grade, 'result_fail'
+
+ITEM_EXCEL_HEADERS = ['#', 'Question', 'Correct', 'Difficulty', 'Discrimination', 'Point-biserial',
+                      'A', 'B', 'C', 'D', 'Blank']
+
+def _excel_item_analysis_sheet(wb, report):
+    ws = wb.create_sheet('Item Analysis')
+    for col, width in enumerate([5, 50, 9, 11, 15, 14, 8, 8, 8, 8, 8], 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    def header(value):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = 'result_header'
+        return cell
+
+    ws.append([header('Quiz version'), report['version'] or 'No versioned submissions yet'])
+    ws.append([header('Students'), report['students']])
+    ws.append([header('Mean score'), report['mean_score']])
+    ws.append([header('KR-20'), report['kr20']])
+    ws.append([])
+    ws.append([header(h) for h in ITEM_EXCEL_HEADERS])
+    for number, item in enumerate(report['items'], 1):
+        options = item['options']
+        ws.append([number, item['question'], item['correct_answer'], item['difficulty'], item['discrimination'],
+                   item['point_biserial'], options['A'], options['B'], options['C'], options['D'], options['blank']])
+
+def export_results_excel(admin_id, progress=None):
+    # Returns a spooled file positioned at the start of the .xlsx data.
+    # progress(rows) is called every 1000 rows.
+    wb = openpyxl.Workbook(write_only=True)
+    for style in _excel_named_styles():
+        wb.add_named_style(style)
+    ws = wb.create_sheet("Student Results")
+
+    value_widths = list(EXCEL_VALUE_WIDTHS)
+    value_widths[0] = longest_student_name(admin_id)
+    for col, (header, value_width) in enumerate(zip(EXCEL_HEADERS, value_widths), 1):
+        ws.column_dimensions[get_column_letter(col)].width = max(len(header), value_width) + 2
+
+    def styled(value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    ws.append([styled(header, 'result_header') for header in EXCEL_HEADERS])
+    summaries = iter_admin_result_summaries(admin_id)
+    for count, (_, student_name, score, total, timestamp) in enumerate(summaries, 1):
+        when = datetime.fromisoformat(timestamp)
+        percentage = round((score / total) * 100, 2) if total > 0 else 0
+        grade, style = _excel_grade(percentage)
+        ws.append([student_name, score, total, styled(percentage, style), styled(grade, style),
+                   when.strftime('%Y-%m-%d'), when.strftime('%I:%M %p')])
+        if progress and count % 1000 == 0:
+            progress(count)
+
+    _excel_item_analysis_sheet(wb, item_analysis(admin_id))
+
+    spool = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_SIZE)
+    wb.save(spool)
+    spool.seek(0)
+    return spool
+
+
+# PDF reports: rendered reports are cached on disk under a sha256 of the
+# result record and PDF_TEMPLATE_VERSION (bump it whenever the layout below
+# changes), so a result that never changes is only rendered once. Hits touch
+# the file's mtime; when the cache grows past PDF_CACHE_MAX_BYTES the least
+# recently used files are evicted.
+PDF_TEMPLATE_VERSION = 1
+PDF_CACHE_DIR = os.getenv('QUIZ_PDF_CACHE_DIR', 'pdf-cache')
+PDF_CACHE_MAX_BYTES = int(os.getenv('QUIZ_PDF_CACHE_MAX_MB', '100')) * 1024 * 1024
+
+_pdf_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_pdf_cache_stats_lock = threading.Lock()
+_pdf_styles = None
+
+def pdf_styles():
+    # Paragraph and table styles shared by every report, built once per process
+    global _pdf_styles
+    if _pdf_styles is None:
+        styles = getSampleStyleSheet()
+        question_style = [
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f9f9f9')),
+            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('PADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
+        ]
+        _pdf_styles = {
+            'title': ParagraphStyle(
+                'CustomTitle',
+                parent=styles['Heading1'],
+                fontSize=24,
+                textColor=colors.HexColor('#333333'),
+                spaceAfter=30,
+                alignment=TA_CENTER
+            ),
+            'student': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f0f0')),
+                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 12),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+                ('TOPPADDING', (0, 0), (-1, -1), 12),
+                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd'))
+            ]),
+            'score': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 12),
+                ('FONTSIZE', (0, 1), (-1, 1), 18),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
+                ('TOPPADDING', (0, 0), (-1, -1), 15),
+                ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#f9f9f9')),
+                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd'))
+            ]),
+            'question_correct': TableStyle(question_style + [
+                ('LINEAFTER', (0, 0), (0, -1), 4, colors.HexColor('#27ae60'))
+            ]),
+            'question_incorrect': TableStyle(question_style + [
+                ('LINEAFTER', (0, 0), (0, -1), 4, colors.HexColor('#e74c3c'))
+            ]),
+            'class_summary': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9f9f9')]),
+                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd'))
+            ])
+        }
+    return _pdf_styles
+
+def result_pdf_elements(result):
+    # Flowables for one student's report
+    styles = pdf_styles()
+    timestamp = datetime.fromisoformat(result['timestamp'])
+    percentage = round((result['score'] / result['total']) * 100, 2) if result['total'] > 0 else 0
+    elements = []
+
+    # Title
+    elements.append(Paragraph("Quiz Result Report", styles['title']))
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Student Info
+    student_info_data = [
+        ['Student Name:', result['student_name']],
+        ['Date:', timestamp.strftime('%Y-%m-%d')],
+        ['Time:', timestamp.strftime('%I:%M %p')],
+    ]
+    student_table = Table(student_info_data, colWidths=[2*inch, 4*inch])
+    student_table.setStyle(styles['student'])
+    elements.append(student_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Score Summary
+    grade = 'A' if percentage >= 70 else 'B' if percentage >= 60 else 'C' if percentage >= 50 else 'D' if percentage >= 40 else 'F'
+    score_data = [
+        ['SCORE', 'PERCENTAGE', 'GRADE'],
+        [f"{result['score']}/{result['total']}", f"{percentage}%", grade]
+    ]
+    score_table = Table(score_data, colWidths=[2*inch, 2*inch, 2*inch])
+    score_table.setStyle(styles['score'])
+    elements.append(score_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Questions
+    for idx, item in enumerate(result['results'], 1):
+        question_data = [
+            [f"Q{idx}: {item['question']}"],
+            [f"Student's Answer: {item['user_answer']}"]
+        ]
+        if not item['correct']:
+            question_data.append([f"Correct Answer: {item['correct_answer']}"])
+        question_table = Table(question_data, colWidths=[6.5*inch])
+        question_table.setStyle(styles['question_correct' if item['correct'] else 'question_incorrect'])
+        elements.append(question_table)
+        elements.append(Spacer(1, 0.15*inch))
+    return elements
+
+def render_result_pdf(result, output):
+    doc = SimpleDocTemplate(output, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    doc.build(result_pdf_elements(result))
+
+def render_result_pdf_bytes(result):
+    # Process-pool task
+    buffer = BytesIO()
+    render_result_pdf(result, buffer)
+    return buffer.getvalue()
+
+def result_pdf_key(result):
+    return pdf_cache_key('result', result)
+
+def pdf_cache_key(kind, data):
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f'{PDF_TEMPLATE_VERSION}:{kind}:{payload}'.encode('utf-8')).hexdigest()
+
+def open_cached_pdf(key):
+    # Open file for a cached report, or None on a miss
+    path = os.path.join(PDF_CACHE_DIR, key + '.pdf')
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        with _pdf_cache_stats_lock:
+            _pdf_cache_stats['misses'] += 1
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass  # Evicted by another worker; the open handle stays readable
+    with _pdf_cache_stats_lock:
+        _pdf_cache_stats['hits'] += 1
+    return f
+
+def store_cached_pdf(key, data, evict=True):
+    # Bulk exports pass evict=False and call evict_pdf_cache() once at the end
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=PDF_CACHE_DIR, prefix='.render-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, os.path.join(PDF_CACHE_DIR, key + '.pdf'))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    if evict:
+        evict_pdf_cache()
+
+def open_result_pdf(admin_id, result):
+    # Open file with the rendered report, from the cache when possible. Quiz
+    # versions are immutable, so the stored record is enough for the key.
+    key = result_pdf_key(result)
+    f = open_cached_pdf(key)
+    if f is None:
+        data = render_result_pdf_bytes(expand_result(admin_id, result))
+        store_cached_pdf(key, data)
+        f = BytesIO(data)
+    return f
+
+def evict_pdf_cache():
+    # Drop least recently used reports until the cache fits PDF_CACHE_MAX_BYTES
+    entries = []
+    total = 0
+    with os.scandir(PDF_CACHE_DIR) as it:
+        for entry in it:
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+            total += st.st_size
+    if total <= PDF_CACHE_MAX_BYTES:
+        return
+    evicted = 0
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+        if total <= PDF_CACHE_MAX_BYTES:
+            break
+    with _pdf_cache_stats_lock:
+        _pdf_cache_stats['evictions'] += evicted
+
+def pdf_cache_stats():
+    with _pdf_cache_stats_lock:
+        return dict(_pdf_cache_stats)
+
+
+# Bulk PDF export: every report of an admin is rendered on a process pool
+# (cache hits are read from disk) and streamed into a ZIP as they complete,
+# or rendered as one combined class report.
+BULK_PDF_WORKERS = int(os.getenv('QUIZ_PDF_WORKERS', str(os.cpu_count() or 1)))
+BULK_PDF_WINDOW = 2 * BULK_PDF_WORKERS  # renders queued ahead of the one being written
+
+_pdf_pool = None
+_pdf_pool_pid = None
+_pdf_pool_lock = threading.Lock()
+
+def pdf_pool():
+    # One pool per process; forked web workers create their own. Renderers
+    # start from a forkserver (spawn on Windows) rather than a fork of this
+    # threaded process, which could copy a lock some other thread holds.
+    global _pdf_pool, _pdf_pool_pid
+    with _pdf_pool_lock:
+        if _pdf_pool is None or _pdf_pool_pid != os.getpid():
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pdf_pool = ProcessPoolExecutor(max_workers=BULK_PDF_WORKERS, mp_context=multiprocessing.get_context(method))
+            _pdf_pool_pid = os.getpid()
+        return _pdf_pool
+
+def result_pdf_filename(index, result):
+    timestamp = datetime.fromisoformat(result['timestamp'])
+    return f"{index + 1:04d}_Quiz_Result_{result['student_name'].replace(' ', '_')}_{timestamp.strftime('%Y%m%d')}.pdf"
+
+def iter_result_pdfs(admin_id, results):
+    # (index, result, pdf bytes) in result order. Misses render in parallel,
+    # at most BULK_PDF_WINDOW at a time so finished PDFs don't pile up in
+    # memory; cache hits are only opened when their turn comes.
+    pool = pdf_pool()
+    window = collections.deque()
+    rendering = 0
+    stored = False
+
+    def render(result):
+        return pool.submit(render_result_pdf_bytes, expand_result(admin_id, result))
+
+    def next_pdf():
+        nonlocal rendering, stored
+        index, result, key, future = window.popleft()
+        if future is None:
+            cached = open_cached_pdf(key)
+            if cached is not None:
+                with cached:
+                    return index, result, cached.read()
+            future = render(result)  # Evicted since it was queued
+        else:
+            rendering -= 1
+        data = future.result()
+        store_cached_pdf(key, data, evict=False)
+        stored = True
+        return index, result, data
+
+    try:
+        for index, result in enumerate(results):
+            key = result_pdf_key(result)
+            if os.path.exists(os.path.join(PDF_CACHE_DIR, key + '.pdf')):
+                window.append((index, result, key, None))
+            else:
+                with _pdf_cache_stats_lock:
+                    _pdf_cache_stats['misses'] += 1
+                window.append((index, result, key, render(result)))
+                rendering += 1
+            while rendering >= BULK_PDF_WINDOW:
+                yield next_pdf()
+        while window:
+            yield next_pdf()
+    finally:
+        for _, _, _, future in window:
+            if future is not None:
+                future.cancel()
+        if stored:
+            evict_pdf_cache()
+
+def iter_results_zip(admin_id, results):
+    # Generator of ZIP bytes. ZipFile writes to an unseekable sink here, so
+    # every entry can be sent as soon as it is added.
+    chunks = []
+
+    def write(data):
+        chunks.append(bytes(data))
+        return len(data)
+
+    started = time.monotonic()
+    count = 0
+    with zipfile.ZipFile(types.SimpleNamespace(write=write, flush=lambda: None), 'w', zipfile.ZIP_STORED) as archive:
+        for index, result, data in iter_result_pdfs(admin_id, results):
+            archive.writestr(result_pdf_filename(index, result), data)
+            count += 1
+            yield b''.join(chunks)
+            chunks.clear()
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed > 0 else 0
+        archive.writestr('export-summary.txt', f"Admin: {admin_id}\nReports: {count}\n"
+                                               f"Seconds: {elapsed:.2f}\nPDFs/second: {rate:.1f}\n")
+    print(f"✓ Exported {count} PDF report(s) for {admin_id} in {elapsed:.2f}s ({rate:.1f} PDFs/s)")
+    yield b''.join(chunks)
+
+def render_class_pdf(admin_id, results, output):
+    styles = pdf_styles()
+    doc = SimpleDocTemplate(output, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    elements = [Paragraph(f"Class Report: {admin_id}", styles['title'])]
+    summary_data = [['STUDENT', 'SCORE', 'PERCENTAGE', 'DATE']]
+    for result in results:
+        percentage = round((result['score'] / result['total']) * 100, 2) if result['total'] > 0 else 0
+        summary_data.append([result['student_name'], f"{result['score']}/{result['total']}", f"{percentage}%",
+                             datetime.fromisoformat(result['timestamp']).strftime('%Y-%m-%d')])
+    summary_table = Table(summary_data, colWidths=[2.6*inch, 1.2*inch, 1.4*inch, 1.3*inch], repeatRows=1)
+    summary_table.setStyle(styles['class_summary'])
+    elements.append(summary_table)
+    for result in results:
+        elements.append(PageBreak())
+        elements.extend(result_pdf_elements(result))
+    doc.build(elements)
+
+def render_class_pdf_bytes(admin_id, results):
+    # Process-pool task
+    buffer = BytesIO()
+    render_class_pdf(admin_id, results, buffer)
+    return buffer.getvalue()
+
+def open_class_pdf(admin_id, results):
+    # The combined report is one reportlab document, so it renders as a single
+    # pool task; that keeps the CPU work off the web worker
+    key = pdf_cache_key('class', [admin_id, results])
+    f = open_cached_pdf(key)
+    if f is None:
+        data = pdf_pool().submit(render_class_pdf_bytes, admin_id, expand_results(admin_id, results)).result()
+        store_cached_pdf(key, data)
+        f = BytesIO(data)
+    return f
+
+# Export jobs: exports run on a bounded thread pool (PDF rendering still goes
+# through pdf_pool) instead of inside the request. Job state lives in
+# exports/<job id>.json next to the artifact, so any worker can answer
+# progress polls and serve the download. Each admin may have
+# EXPORT_MAX_PER_ADMIN jobs queued or running; finished jobs and their
+# artifacts expire after EXPORT_TTL seconds.
+EXPORT_DIR = os.getenv('QUIZ_EXPORT_DIR', 'exports')
+EXPORT_WORKERS = int(os.getenv('QUIZ_EXPORT_WORKERS', '2'))
+EXPORT_MAX_PER_ADMIN = int(os.getenv('QUIZ_EXPORT_MAX_PER_ADMIN', '2'))
+EXPORT_TTL = int(os.getenv('QUIZ_EXPORT_TTL', '3600'))
+EXPORT_KINDS = {
+    # kind -> (artifact extension, mimetype)
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pdf': ('pdf', 'application/pdf'),
+    'pdf-zip': ('zip', 'application/zip'),
+    'class-pdf': ('pdf', 'application/pdf')
+}
+EXPORT_PROGRESS_INTERVAL = 0.5  # seconds between progress writes
+# The dashboard links also point at synchronous download routes, used only
+# when JavaScript is off; they render inside the request, so Excel and bulk
+# PDF downloads there are refused above this many results
+SYNC_EXPORT_MAX_RESULTS = int(os.getenv('QUIZ_SYNC_EXPORT_MAX_RESULTS', '200'))
+
+_export_pool = None
+_export_pool_pid = None
+_export_pool_lock = threading.Lock()
+
+def export_pool():
+    # One pool per process; forked web workers create their own
+    global _export_pool, _export_pool_pid
+    with _export_pool_lock:
+        if _export_pool is None or _export_pool_pid != os.getpid():
+            _export_pool = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+            _export_pool_pid = os.getpid()
+        return _export_pool
+
+def _export_job_path(job_id):
+    return os.path.join(EXPORT_DIR, job_id + '.json')
+
+def _export_artifact_path(job):
+    return os.path.join(EXPORT_DIR, f"{job['id']}.{EXPORT_KINDS[job['kind']][0]}")
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def load_export_job(job_id):
+    # None for unknown or malformed ids
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id or ''):
+        return None
+    try:
+        job = read_json(_export_job_path(job_id))
+    except (FileNotFoundError, ValueError):
+        return None
+    if job['status'] in ('queued', 'running') and not _pid_alive(job['pid']):
+        # The worker process that owned the job is gone
+        job.update(status='failed', error='Export was interrupted', finished_at=datetime.utcnow().isoformat())
+        write_json_atomic(_export_job_path(job_id), job)
+    return job
 
-# Load allowed students
-def load_allowed():
-    with open(ALLOWED_FILE, 'r') as f:
-        return json.load(f)
+def list_export_jobs(admin_id):
+    try:
+        names = os.listdir(EXPORT_DIR)
+    except FileNotFoundError:
+        return []
+    jobs = []
+    for name in names:
+        if name.endswith('.json'):
+            job = load_export_job(name[:-len('.json')])
+            if job is not None and job['admin_id'] == admin_id and not expire_export_job(job):
+                jobs.append(job)
+    return sorted(jobs, key=lambda job: job['created_at'])
 
-def save_allowed(data):
-    with open(ALLOWED_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+def submit_export_job(admin_id, kind, params, download_name):
+    # Returns (job, error message)
+    if kind not in EXPORT_KINDS:
+        return None, 'Unknown export type.'
+    expire_export_jobs()
+    with admin_lock(admin_id):
+        active = [job for job in list_export_jobs(admin_id) if job['status'] in ('queued', 'running')]
+        if len(active) >= EXPORT_MAX_PER_ADMIN:
+            return None, f'You already have {len(active)} export(s) in progress. Please wait for them to finish.'
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        job = {
+            'id': uuid.uuid4().hex,
+            'admin_id': admin_id,
+            'kind': kind,
+            'params': params,
+            'download_name': download_name,
+            'status': 'queued',
+            'progress': {'done': 0, 'total': None},
+            'error': None,
+            'pid': os.getpid(),
+            'created_at': datetime.utcnow().isoformat(),
+            'finished_at': None
+        }
+        write_json_atomic(_export_job_path(job['id']), job)
+    # The worker gets its own copy to update
+    export_pool().submit(_run_export_job, dict(job, progress=dict(job['progress'])))
+    return job, None
 
-# Save admins
-def save_admins(admins):
-    with open(ADMINS_FILE, 'w') as f:
-        json.dump(admins, f, indent=2)
+def _write_export(job, out, progress):
+    admin_id = job['admin_id']
+    kind = job['kind']
+    if kind == 'excel':
+        progress(0, load_admin_analytics(admin_id)['count'])
+        with export_results_excel(admin_id, progress=progress) as export:
+            shutil.copyfileobj(export, out)
+    elif kind == 'pdf':
+        result = load_admin_answer(admin_id, job['params']['result_id'])
+        if result is None:
+            raise ValueError('Result not found.')
+        progress(0, 1)
+        with open_result_pdf(admin_id, result) as report:
+            shutil.copyfileobj(report, out)
+    elif kind == 'pdf-zip':
+        count = load_admin_analytics(admin_id)['count']
+        progress(0, count)
+        for done, chunk in enumerate(iter_results_zip(admin_id, iter_admin_answers(admin_id)), 1):
+            out.write(chunk)
+            progress(min(done, count))
+    elif kind == 'class-pdf':
+        results = load_admin_answers(admin_id)
+        progress(0, len(results))
+        with open_class_pdf(admin_id, results) as report:
+            shutil.copyfileobj(report, out)
 
-# Load questions
-def load_questions():
-    with open(QUESTIONS_FILE, 'r') as f:
-        return json.load(f)
+def _run_export_job(job):
+    path = _export_job_path(job['id'])
+    job['status'] = 'running'
+    write_json_atomic(path, job)
+    last_write = time.monotonic()
 
-# Save questions
-def save_questions(questions):
-    with open(QUESTIONS_FILE, 'w') as f:
-        json.dump(questions, f, indent=2)
+    def progress(done, total=None):
+        nonlocal last_write
+        job['progress']['done'] = done
+        if total is not None:
+            job['progress']['total'] = total
+        if time.monotonic() - last_write >= EXPORT_PROGRESS_INTERVAL:
+            write_json_atomic(path, job)
+            last_write = time.monotonic()
 
-# Load answers
-def load_answers():
-    with open(ANSWERS_FILE, 'r') as f:
-        return json.load(f)
+    artifact = _export_artifact_path(job)
+    partial = artifact + '.part'
+    try:
+        with open(partial, 'wb') as out:
+            _write_export(job, out, progress)
+        os.replace(partial, artifact)
+        if job['progress']['total'] is not None:
+            job['progress']['done'] = job['progress']['total']
+        job['status'] = 'done'
+    except Exception as e:
+        print(f"✗ Export {job['id']} ({job['kind']}) for {job['admin_id']} failed: {e}")
+        try:
+            os.remove(partial)
+        except FileNotFoundError:
+            pass
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    job['finished_at'] = datetime.utcnow().isoformat()
+    write_json_atomic(path, job)
 
-# Save answers
-def save_answers(answers):
-    with open(ANSWERS_FILE, 'w') as f:
-        json.dump(answers, f, indent=2)
+def expire_export_job(job):
+    # Remove a job finished more than EXPORT_TTL ago; True if it was removed
+    if not job['finished_at']:
+        return False
+    if datetime.fromisoformat(job['finished_at']) >= datetime.utcnow() - timedelta(seconds=EXPORT_TTL):
+        return False
+    for expired in (_export_artifact_path(job), _export_job_path(job['id'])):
+        try:
+            os.remove(expired)
+        except FileNotFoundError:
+            pass
+    return True
 
-# Load quiz settings
-def load_quiz_settings():
-    with open(QUIZ_SETTINGS_FILE, 'r') as f:
-        return json.load(f)
+def expire_export_jobs():
+    # Run by the sweeper thread, so exports nobody looks at again are removed too
+    try:
+        names = os.listdir(EXPORT_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith('.json'):
+            job = load_export_job(name[:-len('.json')])
+            if job is not None:
+                expire_export_job(job)
+
+def export_job_status(job):
+    # Public view of a job for the API
+    status = {
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+        'status_url': url_for('export_job_api', job_id=job['id'])
+    }
+    if job['status'] == 'done':
+        status['download_url'] = url_for('export_job_download', job_id=job['id'])
+        status['expires_at'] = (datetime.fromisoformat(job['finished_at']) + timedelta(seconds=EXPORT_TTL)).isoformat()
+    return status
+
+@app.cli.command('export-pdfs')
+@click.argument('admin_id')
+@click.argument('output')
+@click.option('--combined', is_flag=True, help='Write one class-report PDF instead of a ZIP.')
+def export_pdfs_command(admin_id, output, combined):
+    """Export every student's PDF report for ADMIN_ID and print the throughput."""
+    results = load_admin_answers(admin_id)
+    started = time.monotonic()
+    with open(output, 'wb') as out:
+        if combined:
+            with open_class_pdf(admin_id, results) as report:
+                shutil.copyfileobj(report, out)
+        else:
+            for chunk in iter_results_zip(admin_id, results):
+                out.write(chunk)
+    elapsed = time.monotonic() - started
+    rate = len(results) / elapsed if elapsed > 0 else 0
+    print(f"✓ {len(results)} report(s) in {elapsed:.2f}s ({rate:.1f} PDFs/s) -> {output}")
 
-# Save quiz settings
-def save_quiz_settings(settings):
-    with open(QUIZ_SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=2)
 
 # HTML Templates
 HOME_TEMPLATE = '''
@@ -1084,6 +3982,170 @@ ADMIN_PANEL_TEMPLATE = '''
             document.querySelectorAll('.tab-btn').forEach(b => b.classList.remove('active'));
             document.getElementById(tabName).classList.add('active');
             event.target.classList.add('active');
+            if (tabName === 'results-section' && !resultsLoaded) {
+                resultsLoaded = true;
+                loadResults(true);
+            }
+            if (tabName === 'analytics-section' && !itemsLoaded && document.getElementById('item-body')) {
+                itemsLoaded = true;
+                loadItemAnalysis('');
+            }
+        }
+
+        // Item analysis is computed on request from the item analysis API
+        let itemsLoaded = false;
+
+        function loadItemAnalysis(version) {
+            const params = new URLSearchParams(version ? {version: version} : {});
+            fetch("{{ url_for('item_analysis_api') }}?" + params.toString())
+                .then(response => response.json())
+                .then(data => {
+                    const select = document.getElementById('item-version');
+                    select.innerHTML = '';
+                    data.versions.forEach(v => {
+                        const option = document.createElement('option');
+                        option.value = v.version;
+                        option.textContent = v.version + (v.published ? ' (published)' : '') + ' · ' + v.submissions + ' submissions';
+                        option.selected = v.version === data.version;
+                        select.appendChild(option);
+                    });
+                    const fmt = value => value === null ? '—' : value.toFixed(2);
+                    document.getElementById('item-summary').textContent = data.version
+                        ? data.students + ' students · mean ' + fmt(data.mean_score) + ' · KR-20 ' + fmt(data.kr20)
+                        : 'No submissions with per-question answers yet.';
+                    const body = document.getElementById('item-body');
+                    body.innerHTML = '';
+                    data.items.forEach((item, i) => {
+                        const row = document.createElement('tr');
+                        const cell = (text, style) => {
+                            const td = document.createElement('td');
+                            td.textContent = text;
+                            if (style) td.style.cssText = style;
+                            row.appendChild(td);
+                        };
+                        const flag = 'color: #e74c3c; font-weight: 700;';
+                        cell(i + 1);
+                        cell(item.question);
+                        cell(fmt(item.difficulty), item.difficulty !== null && (item.difficulty < 0.2 || item.difficulty > 0.9) ? flag : '');
+                        cell(fmt(item.discrimination), item.discrimination !== null && item.discrimination < 0.2 ? flag : '');
+                        cell(fmt(item.point_biserial));
+                        ['A', 'B', 'C', 'D', 'blank'].forEach(option => {
+                            cell(item.options[option], option === item.correct_answer ? 'color: #27ae60; font-weight: 700;' : '');
+                        });
+                        body.appendChild(row);
+                    });
+                });
+        }
+
+        // Results are loaded page by page from the results API
+        let resultsLoaded = false;
+        let resultsCursor = null;
+        let resultsRequest = 0;
+
+        function loadResults(reset) {
+            const sortValue = document.getElementById('results-sort').value.split(':');
+            const params = new URLSearchParams({
+                sort: sortValue[0],
+                order: sortValue[1],
+                q: document.getElementById('results-filter').value,
+                limit: 50
+            });
+            if (reset) {
+                resultsCursor = null;
+            } else if (resultsCursor) {
+                params.set('cursor', resultsCursor);
+            }
+            const requestId = ++resultsRequest;
+            fetch("{{ url_for('admin_results_api') }}?" + params.toString())
+                .then(response => response.json())
+                .then(data => {
+                    if (requestId !== resultsRequest) return;
+                    const body = document.getElementById('results-body');
+                    if (reset) body.innerHTML = '';
+                    data.results.forEach(result => body.appendChild(resultRow(result)));
+                    resultsCursor = data.next_cursor;
+                    document.getElementById('results-total').textContent = data.total;
+                    document.getElementById('results-more').style.display = data.next_cursor ? 'inline-block' : 'none';
+                });
+        }
+
+        function resultRow(result) {
+            const row = document.createElement('tr');
+            const cell = (style) => {
+                const td = document.createElement('td');
+                if (style) td.style.cssText = style;
+                row.appendChild(td);
+                return td;
+            };
+            const name = document.createElement('strong');
+            name.textContent = result.student_name;
+            cell().appendChild(name);
+            cell('text-align: center;').textContent = result.score + '/' + result.total;
+            const badge = document.createElement('span');
+            badge.style.cssText = 'display: inline-block; padding: 4px 12px; border-radius: 20px; font-weight: 600; color: white;';
+            badge.style.background = result.percentage >= 70 ? '#27ae60' : (result.percentage >= 50 ? '#f39c12' : '#e74c3c');
+            badge.textContent = result.percentage + '%';
+            cell('text-align: center;').appendChild(badge);
+            const when = cell('text-align: center; font-size: 0.9rem;');
+            when.appendChild(document.createTextNode(result.date));
+            when.appendChild(document.createElement('br'));
+            when.appendChild(document.createTextNode(result.time));
+            const link = document.createElement('a');
+            link.href = result.pdf_url;
+            link.onclick = () => startExport('pdf', {result_id: result.id});
+            link.className = 'btn btn-primary';
+            link.style.cssText = 'padding: 8px 16px; font-size: 0.9rem;';
+            link.textContent = '📥 PDF';
+            cell('text-align: center;').appendChild(link);
+            return row;
+        }
+
+        let filterTimer = null;
+        function filterResults() {
+            clearTimeout(filterTimer);
+            filterTimer = setTimeout(() => loadResults(true), 250);
+        }
+
+        // Exports run as background jobs; poll until the file is ready
+        // (the hrefs are the synchronous no-JS fallback)
+        function startExport(kind, params) {
+            const status = document.getElementById('export-status');
+            status.textContent = 'Starting export...';
+            fetch("{{ url_for('export_jobs_api') }}", {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify(Object.assign({kind: kind}, params))
+            })
+                .then(response => response.json().then(data => ({ok: response.ok, data: data})))
+                .then(({ok, data}) => {
+                    if (!ok) {
+                        status.textContent = data.error;
+                        return;
+                    }
+                    pollExport(data.status_url);
+                })
+                .catch(() => { status.textContent = 'Could not start the export.'; });
+            return false;
+        }
+
+        function pollExport(statusUrl) {
+            const status = document.getElementById('export-status');
+            fetch(statusUrl)
+                .then(response => response.json())
+                .then(job => {
+                    if (!job.status) {
+                        status.textContent = job.error;
+                    } else if (job.status === 'done') {
+                        status.textContent = 'Export ready.';
+                        window.location = job.download_url;
+                    } else if (job.status === 'failed') {
+                        status.textContent = 'Export failed: ' + job.error;
+                    } else {
+                        const total = job.progress.total;
+                        status.textContent = 'Exporting... ' + job.progress.done + (total !== null ? ' / ' + total : '');
+                        setTimeout(() => pollExport(statusUrl), 1000);
+                    }
+                });
         }
     </script>
 </head>
@@ -1104,11 +4166,11 @@ ADMIN_PANEL_TEMPLATE = '''
             </div>
             <div class="stat-item" style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);">
                 <div class="stat-label">Student Submissions</div>
-                <div class="stat-value">{{ student_results|length }}</div>
+                <div class="stat-value">{{ analytics.total_students }}</div>
             </div>
             <div class="stat-item" style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);">
                 <div class="stat-label">Submitted by</div>
-                <div class="stat-value">{{ submitted_names|length }}</div>
+                <div class="stat-value">{{ submitter_count }}</div>
             </div>
         </div>
 
@@ -1122,6 +4184,20 @@ ADMIN_PANEL_TEMPLATE = '''
         <div id="questions-section" class="content-panel active">
             <h2>📋 Manage Questions</h2>
             <hr style="margin: 20px 0;">
+
+            <div class="alert-box {% if draft_changed %}info{% else %}success{% endif %}">
+                {% if published_version %}
+                    🔒 Students take published version <strong>{{ published_version }}</strong> ({{ published_count }} questions).
+                {% else %}
+                    🔓 This quiz has not been published yet, so students cannot take it.
+                {% endif %}
+                {% if draft_changed %}
+                    The questions below have unpublished changes.
+                    <form method="POST" action="{{ url_for('publish_questions') }}" style="display: inline;">
+                        <button type="submit" class="btn btn-success" style="margin-left: 10px;">🚀 Publish</button>
+                    </form>
+                {% endif %}
+            </div>
             
             <h4>Add New Question</h4>
             <form method="POST" action="{{ url_for('admin_panel') }}">
@@ -1163,6 +4239,34 @@ ADMIN_PANEL_TEMPLATE = '''
                 <button type="submit" class="btn btn-primary">✅ Add Question</button>
             </form>
 
+            <hr style="margin: 40px 0;">
+            <h4>Import / Export Question Bank</h4>
+            <p style="color: #555;">
+                CSV or Excel columns: <code>question, option_a, option_b, option_c, option_d, correct_answer</code>
+                (optional <code>id</code>; a matching id updates that question). JSON: a list of questions as exported.
+            </p>
+            <form method="POST" action="{{ url_for('import_questions') }}" enctype="multipart/form-data">
+                <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px;">
+                    <div class="form-group">
+                        <label>Question File</label>
+                        <input type="file" name="questions_file" class="form-control" accept=".csv,.txt,.xlsx,.json" required>
+                    </div>
+                    <div class="form-group">
+                        <label>Import Mode</label>
+                        <select name="mode" class="form-control">
+                            <option value="append">Add to existing questions</option>
+                            <option value="replace">Replace all questions</option>
+                        </select>
+                    </div>
+                </div>
+                <button type="submit" class="btn btn-primary">📥 Import Questions</button>
+                {% if questions %}
+                    <a href="{{ url_for('export_questions', format='csv') }}" class="btn btn-secondary">📤 Export CSV</a>
+                    <a href="{{ url_for('export_questions', format='xlsx') }}" class="btn btn-secondary">📤 Export Excel</a>
+                    <a href="{{ url_for('export_questions', format='json') }}" class="btn btn-secondary">📤 Export JSON</a>
+                {% endif %}
+            </form>
+
             <hr style="margin: 40px 0;">
             <h4>Your Questions ({{ questions|length }} total)</h4>
             
@@ -1176,7 +4280,7 @@ ADMIN_PANEL_TEMPLATE = '''
                             <div class="option-item {% if q.correct_answer == 'C' %}correct{% endif %}">C) {{ q.options.C }}</div>
                             <div class="option-item {% if q.correct_answer == 'D' %}correct{% endif %}">D) {{ q.options.D }}</div>
                         </div>
-                        <form method="POST" action="{{ url_for('delete_question', index=loop.index0) }}" style="display: inline;">
+                        <form method="POST" action="{{ url_for('delete_question', question_id=q.id) }}" style="display: inline;">
                             <button type="submit" class="btn btn-secondary" style="margin-top: 12px;" onclick="return confirm('Delete this question?')">🗑️ Delete</button>
                         </form>
                     </div>
@@ -1216,11 +4320,12 @@ ADMIN_PANEL_TEMPLATE = '''
             <hr style="margin: 30px 0;">
             <h4>📥 Upload Student List (CSV)</h4>
             <div style="background: #f0f4ff; padding: 15px; border-radius: 8px; margin-bottom: 20px; border-left: 4px solid #667eea;">
-                <strong style="color: #667eea;">📋 CSV Format Instructions:</strong>
+                <strong style="color: #667eea;">📋 CSV / Excel Format Instructions:</strong>
                 <ul style="color: #555; margin: 10px 0; padding-left: 20px;">
                     <li><strong>First column:</strong> Student Name</li>
                     <li><strong>Second column:</strong> Student ID</li>
-                    <li><strong>Separator:</strong> Comma (,) or Tab</li>
+                    <li><strong>Separator:</strong> Comma (,) or Tab, or upload an .xlsx file</li>
+                    <li><strong>Duplicates:</strong> Repeated Student IDs are skipped and reported</li>
                     <li><strong>Example:</strong> <code style="background: white; padding: 2px 6px; border-radius: 3px;">Alfayo3 Nkinda,EASTC/BDTS/24/01034</code></li>
                 </ul>
                 <strong style="color: #e74c3c;">⚠️ From Excel:</strong> Copy from Excel and paste into .csv file (Excel exports with tabs by default)
@@ -1228,10 +4333,18 @@ ADMIN_PANEL_TEMPLATE = '''
             
             <form method="POST" action="{{ url_for('upload_students') }}" enctype="multipart/form-data">
                 <div class="form-group">
-                    <label>Select CSV File</label>
-                    <input type="file" name="students_file" class="form-control" accept=".csv,.txt" required>
+                    <label>Select CSV or Excel File</label>
+                    <input type="file" name="students_file" class="form-control" accept=".csv,.txt,.xlsx" required>
+                </div>
+                <div class="form-group">
+                    <label>Upload Mode</label>
+                    <select name="mode" class="form-control">
+                        <option value="replace">Replace the student list</option>
+                        <option value="add">Add new students and update names</option>
+                        <option value="remove">Remove these students (by Student ID)</option>
+                    </select>
                 </div>
-                <button type="submit" class="btn btn-primary">📤 Upload & Replace Student List</button>
+                <button type="submit" class="btn btn-primary">📤 Upload Student List</button>
             </form>
 
             {% if allowed_list %}
@@ -1278,8 +4391,19 @@ ADMIN_PANEL_TEMPLATE = '''
             <h2>📊 Student Results</h2>
             <hr style="margin: 20px 0;">
             
-            {% if student_results %}
-                <p style="color: #666; margin-bottom: 20px;">Total Submissions: <strong>{{ student_results|length }}</strong></p>
+            {% if analytics.total_students > 0 %}
+                <p style="color: #666; margin-bottom: 20px;">Total Submissions: <strong id="results-total">{{ analytics.total_students }}</strong></p>
+                <div style="display: flex; gap: 10px; margin-bottom: 20px;">
+                    <input type="text" id="results-filter" placeholder="Filter by student name" oninput="filterResults()" style="flex: 1;">
+                    <select id="results-sort" onchange="loadResults(true)">
+                        <option value="time:asc">Oldest first</option>
+                        <option value="time:desc">Newest first</option>
+                        <option value="score:desc">Highest score</option>
+                        <option value="score:asc">Lowest score</option>
+                        <option value="name:asc">Name A-Z</option>
+                        <option value="name:desc">Name Z-A</option>
+                    </select>
+                </div>
                 <table>
                     <thead>
                         <tr>
@@ -1290,29 +4414,19 @@ ADMIN_PANEL_TEMPLATE = '''
                             <th style="text-align: center;">Action</th>
                         </tr>
                     </thead>
-                    <tbody>
-                        {% for result in student_results %}
-                            <tr>
-                                <td><strong>{{ result.student_name }}</strong></td>
-                                <td style="text-align: center;">{{ result.score }}/{{ result.total }}</td>
-                                <td style="text-align: center;">
-                                    <span style="display: inline-block; padding: 4px 12px; border-radius: 20px; font-weight: 600; color: white; background: {% if result.percentage >= 70 %}#27ae60{% elif result.percentage >= 50 %}#f39c12{% else %}#e74c3c{% endif %};">
-                                        {{ result.percentage }}%
-                                    </span>
-                                </td>
-                                <td style="text-align: center; font-size: 0.9rem;">{{ result.date }}<br>{{ result.time }}</td>
-                                <td style="text-align: center;">
-                                    <a href="{{ url_for('download_pdf', index=loop.index0) }}" class="btn btn-primary" style="padding: 8px 16px; font-size: 0.9rem;">📥 PDF</a>
-                                </td>
-                            </tr>
-                        {% endfor %}
-                    </tbody>
+                    <tbody id="results-body"></tbody>
                 </table>
+                <div style="text-align: center; margin-top: 15px;">
+                    <button type="button" id="results-more" class="btn btn-primary" style="display: none;" onclick="loadResults(false)">Load more</button>
+                </div>
 
                 <div style="margin-top: 30px; padding: 20px; background: linear-gradient(135deg, #e3f2fd 0%, #bbdefb 100%); border-radius: 8px; text-align: center;">
                     <h4>📥 Download All Results</h4>
-                    <p style="color: #1565c0; margin: 10px 0;">Export to Excel spreadsheet</p>
-                    <a href="{{ url_for('download_excel') }}" class="btn btn-info">📊 Download Excel</a>
+                    <p style="color: #1565c0; margin: 10px 0;">Export to Excel spreadsheet or PDF reports</p>
+                    <a href="{{ url_for('download_excel') }}" class="btn btn-info" onclick="return startExport('excel')">📊 Download Excel</a>
+                    <a href="{{ url_for('download_all_pdfs') }}" class="btn btn-info" onclick="return startExport('pdf-zip')">🗂️ All PDFs (ZIP)</a>
+                    <a href="{{ url_for('download_all_pdfs', combined=1) }}" class="btn btn-info" onclick="return startExport('class-pdf')">📄 Class Report PDF</a>
+                    <p id="export-status" style="color: #1565c0; margin: 10px 0 0;"></p>
                 </div>
             {% else %}
                 <div class="alert-box info">
@@ -1375,30 +4489,44 @@ ADMIN_PANEL_TEMPLATE = '''
                             <td><strong>Failed (<70%):</strong></td>
                             <td><span style="color: #e74c3c; font-weight: 700;">{{ analytics.fail_count }}</span></td>
                             <td><strong>Std. Deviation:</strong></td>
-                            <td>{{ analytics.std_dev|default('N/A') }}</td>
+                            <td>{{ analytics.std_dev }}{% if analytics.std_dev != 'N/A' %}%{% endif %}</td>
                         </tr>
                     </table>
                 </div>
 
+                <div class="chart-container">
+                    <h4>Item Analysis</h4>
+                    <div style="margin-bottom: 15px;">
+                        <select id="item-version" class="form-control" style="max-width: 360px; display: inline-block;" onchange="loadItemAnalysis(this.value)"></select>
+                        <span id="item-summary" style="margin-left: 15px; color: #555;"></span>
+                    </div>
+                    <p style="color: #888; font-size: 0.9rem;">
+                        Difficulty: share answering correctly. Discrimination: top 27% minus bottom 27%.
+                        Items in red are very easy/hard (&lt;0.2 or &gt;0.9) or discriminate poorly (&lt;0.2).
+                    </p>
+                    <table>
+                        <thead>
+                            <tr>
+                                <th>#</th><th>Question</th><th>Difficulty</th><th>Discrimination</th><th>Point-biserial</th>
+                                <th>A</th><th>B</th><th>C</th><th>D</th><th>Blank</th>
+                            </tr>
+                        </thead>
+                        <tbody id="item-body"></tbody>
+                    </table>
+                </div>
+
                 <script>
-                    const percentages = {{ percentages|tojson }};
-                    if (percentages && percentages.length > 0) {
-                        const gradeRanges = {
-                            'A (90-100%)': percentages.filter(p => p >= 90).length,
-                            'B (80-89%)': percentages.filter(p => p >= 80 && p < 90).length,
-                            'C (70-79%)': percentages.filter(p => p >= 70 && p < 80).length,
-                            'D (60-69%)': percentages.filter(p => p >= 60 && p < 70).length,
-                            'F (<60%)': percentages.filter(p => p < 60).length
-                        };
-                        
+                    const gradeLabels = {{ analytics.grade_labels|tojson }};
+                    const gradeCounts = {{ analytics.grade_counts|tojson }};
+                    if (gradeCounts.some(c => c > 0)) {
                         const ctx1 = document.getElementById('scoreChart').getContext('2d');
                         new Chart(ctx1, {
                             type: 'bar',
                             data: {
-                                labels: Object.keys(gradeRanges),
+                                labels: gradeLabels,
                                 datasets: [{
                                     label: 'Students',
-                                    data: Object.values(gradeRanges),
+                                    data: gradeCounts,
                                     backgroundColor: ['#27ae60', '#f39c12', '#3498db', '#e67e22', '#e74c3c'],
                                     borderRadius: 8,
                                     borderSkipped: false
@@ -1849,6 +4977,7 @@ USER_QUIZ_TEMPLATE = '''
                 <input type="hidden" id="student-name-hidden" name="student_name">
                 <input type="hidden" id="student-id-hidden" name="student_id">
                 <input type="hidden" name="admin_id" value="{{ admin_id }}">
+                <input type="hidden" name="quiz_version" value="{{ quiz_version }}">
 
                 <div id="quiz-content">
                 {% for q in questions %}
@@ -1856,19 +4985,19 @@ USER_QUIZ_TEMPLATE = '''
                         <h3>Question {{ loop.index }}: {{ q.question }}</h3>
                         <div class="options">
                             <label class="option">
-                                <input type="radio" name="q{{ loop.index0 }}" value="A" required>
+                                <input type="radio" name="q_{{ q.id }}" value="A" required>
                                 A) {{ q.options.A }}
                             </label>
                             <label class="option">
-                                <input type="radio" name="q{{ loop.index0 }}" value="B">
+                                <input type="radio" name="q_{{ q.id }}" value="B">
                                 B) {{ q.options.B }}
                             </label>
                             <label class="option">
-                                <input type="radio" name="q{{ loop.index0 }}" value="C">
+                                <input type="radio" name="q_{{ q.id }}" value="C">
                                 C) {{ q.options.C }}
                             </label>
                             <label class="option">
-                                <input type="radio" name="q{{ loop.index0 }}" value="D">
+                                <input type="radio" name="q_{{ q.id }}" value="D">
                                 D) {{ q.options.D }}
                             </label>
                         </div>
@@ -1880,9 +5009,8 @@ USER_QUIZ_TEMPLATE = '''
             </form>
 
             <script>
-                // Client-side entry gate: require name + reg no to be in allowed list
-                const allowedEntries = {{ allowed_list|tojson }} || [];
-                const existingNames = {{ existing_names|tojson }} || [];
+                // Entry gate: the server checks name + reg no against the roster and past submissions
+                const verifyUrl = {{ url_for('verify_student', admin_id=admin_id)|tojson }};
 
                 const authName = document.getElementById('auth-name');
                 const authId = document.getElementById('auth-id');
@@ -1893,7 +5021,7 @@ USER_QUIZ_TEMPLATE = '''
                 const studentIdHidden = document.getElementById('student-id-hidden');
                 const timerDisplay = document.getElementById('timer-display');
 
-                function startQuiz() {
+                async function startQuiz() {
                     const nameVal = (authName.value || '').trim();
                     const idVal = (authId.value || '').trim();
                     if (!nameVal || !idVal) {
@@ -1902,16 +5030,21 @@ USER_QUIZ_TEMPLATE = '''
                         return;
                     }
 
-                    const allowed = allowedEntries.some(e => (e.name||'').trim().toLowerCase() === nameVal.toLowerCase() && (e.student_id||'').trim().toLowerCase() === idVal.toLowerCase());
-                    if (!allowed) {
-                        authWarning.textContent = 'You are not allowed to take this quiz. Please contact the instructor.';
-                        authWarning.style.display = 'block';
-                        return;
+                    startBtn.disabled = true;
+                    let data;
+                    try {
+                        const response = await fetch(verifyUrl, {
+                            method: 'POST',
+                            headers: {'Content-Type': 'application/json'},
+                            body: JSON.stringify({student_name: nameVal, student_id: idVal})
+                        });
+                        data = await response.json();
+                    } catch (err) {
+                        data = {error: 'Could not reach the server. Please try again.'};
                     }
-
-                    const already = existingNames.some(n => (n||'').trim().toLowerCase() === nameVal.toLowerCase());
-                    if (already) {
-                        authWarning.textContent = 'You have already submitted this quiz.';
+                    startBtn.disabled = false;
+                    if (data.error) {
+                        authWarning.textContent = data.error;
                         authWarning.style.display = 'block';
                         return;
                     }
@@ -2043,17 +5176,181 @@ RESULTS_TEMPLATE = '''
 </html>
 '''
 
+bootstrap_storage()
+
+
+# Templates are registered with a DictLoader so Jinja compiles each one once
+# and serves it from its template cache instead of re-parsing the source on
+# every request. Auto-reload follows TEMPLATES_AUTO_RELOAD, i.e. debug only.
+TEMPLATES = {
+    'home.html': HOME_TEMPLATE,
+    'start.html': START_TEMPLATE,
+    'admin_login.html': ADMIN_LOGIN_TEMPLATE,
+    'admin_panel.html': ADMIN_PANEL_TEMPLATE,
+    'quiz_select.html': QUIZ_SELECT_TEMPLATE,
+    'user_quiz.html': USER_QUIZ_TEMPLATE,
+    'results.html': RESULTS_TEMPLATE
+}
+app.jinja_loader = DictLoader(TEMPLATES)
+
+def warm_templates():
+    # Compile every template at worker startup rather than on first request
+    for name in TEMPLATES:
+        app.jinja_env.get_template(name)
+
+warm_templates()
+
+def _bench_contexts():
+    # Representative render contexts for bench-templates
+    questions = [{'id': f'{i:012x}', 'question': f'Question {i}?',
+                  'options': {'A': 'Alpha', 'B': 'Beta', 'C': 'Gamma', 'D': 'Delta'}, 'correct_answer': 'A'} for i in range(20)]
+    allowed_list = [{'name': f'Student {i}', 'student_id': f'S{i:04d}'} for i in range(200)]
+    stats = _empty_analytics()
+    for i in range(200):
+        _add_to_analytics(stats, (i * 37) % 101)
+    return {
+        'home.html': {},
+        'start.html': {},
+        'admin_login.html': {},
+        'admin_panel.html': {'current_admin': 'bench', 'questions': questions, 'quiz_time_limit': 30,
+                             'published_version': quiz_version(questions), 'published_count': len(questions),
+                             'draft_changed': False, 'analytics': analytics_summary(stats), 'submitter_count': 200,
+                             'allowed_list': allowed_list},
+        'quiz_select.html': {'available_quizzes': [{'admin_id': f'admin{i}', 'admin_name': f'admin{i}',
+                                                    'question_count': 20, 'time_limit': 30} for i in range(10)]},
+        'user_quiz.html': {'questions': questions, 'quiz_version': quiz_version(questions), 'admin_name': 'bench',
+                           'admin_id': 'bench', 'time_limit': 30},
+        'results.html': {'student_name': 'Student 0', 'score': 15, 'total': 20, 'percentage': 75.0,
+                         'results': [{'question': q['question'], 'user_answer': 'B', 'correct_answer': 'A',
+                                      'correct': False} for q in questions]}
+    }
+
+@app.cli.command('bench-templates')
+@click.option('--iterations', default=200, show_default=True)
+def bench_templates_command(iterations):
+    """Compare per-template render time: render_template_string vs the cached templates."""
+    print(f"{'template':<20}{'string (ms)':>14}{'cached (ms)':>14}{'speedup':>10}")
+    with app.test_request_context('/'):
+        for name, context in _bench_contexts().items():
+            timings = []
+            for render in (lambda: render_template_string(TEMPLATES[name], **context),
+                           lambda: render_template(name, **context)):
+                render()
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    render()
+                timings.append((time.perf_counter() - started) * 1000 / iterations)
+            print(f"{name:<20}{timings[0]:>14.3f}{timings[1]:>14.3f}{timings[0] / timings[1]:>9.1f}x")
+
+# Write stress test: separate processes (like gunicorn workers) add
+# submissions and questions to a few shared admins in a scratch directory,
+# then every write is checked to be there. Run with QUIZ_STORAGE and
+# QUIZ_SUBMISSION_LOG set to test the other write paths.
+def _stress_admin(worker, write, admins):
+    return f'stress{(worker + write) % admins}'
+
+def stress_writer(worker, writes, admins):
+    for j in range(writes):
+        admin_id = _stress_admin(worker, j, admins)
+        add_answer(admin_id, {'student_name': f'writer {worker}-{j}', 'student_id': f'W{worker}-{j}', 'score': 1,
+                              'total': 1, 'timestamp': datetime.now().isoformat(), 'results': []})
+        add_admin_question(admin_id, {'question': f'{worker}-{j}', 'options': {'A': 'a', 'B': 'b', 'C': 'c', 'D': 'd'},
+                                      'correct_answer': 'A'})
+
+def stress_check(processes, writes, admins):
+    lost = 0
+    for k in range(admins):
+        admin_id = f'stress{k}'
+        expected = {f'writer {i}-{j}' for i in range(processes) for j in range(writes) if _stress_admin(i, j, admins) == admin_id}
+        names = [entry['student_name'] for entry in load_admin_answers(admin_id)]
+        questions = len(load_admin_questions(admin_id))
+        missing = len(expected - set(names))
+        if missing or len(names) != len(expected) or questions != len(expected):
+            print(f"✗ {admin_id}: {len(names)} submissions and {questions} questions, expected {len(expected)} ({missing} missing)")
+            lost += 1
+    return lost
+
+@app.cli.command('stress-writes')
+@click.option('--processes', default=8, show_default=True)
+@click.option('--writes', default=30, show_default=True, help='Submissions (and questions) per process')
+@click.option('--admins', default=3, show_default=True)
+def stress_writes_command(processes, writes, admins):
+    """Run concurrent writer processes on a scratch data directory and fail if any write was lost."""
+    scratch = tempfile.mkdtemp(prefix='quiz-stress-')
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, QUIZ_SWEEP_INTERVAL='0',
+               PYTHONPATH=os.pathsep.join(filter(None, [app_dir, os.environ.get('PYTHONPATH')])))
+    # Relative storage paths resolve inside the scratch directory
+    for name in ('QUIZ_DATA_DIR', 'QUIZ_DATABASE', 'QUIZ_OUTBOX_DIR', 'QUIZ_PDF_CACHE_DIR', 'QUIZ_EXPORT_DIR'):
+        env.pop(name, None)
+    module = __name__ if __name__ != '__main__' else 'app'
+
+    def run(call, *args):
+        code = f'import sys, {module} as quiz; sys.exit({call}(*map(int, sys.argv[1:])))'
+        return subprocess.Popen([sys.executable, '-c', code, *map(str, args)], cwd=scratch, env=env)
+
+    try:
+        started = time.perf_counter()
+        writers = [run('quiz.stress_writer', i, writes, admins) for i in range(processes)]
+        failed = sum(1 for p in writers if p.wait() != 0)
+        elapsed = time.perf_counter() - started
+        lost = run('quiz.stress_check', processes, writes, admins).wait()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    total = processes * writes
+    print(f"{STORAGE_BACKEND}{' + log' if SUBMISSION_LOG else ''}: {processes} processes x {writes} writes "
+          f"in {elapsed:.2f}s ({2 * total / elapsed:.0f} writes/s)")
+    if failed or lost:
+        raise click.ClickException(f'{failed} writer(s) crashed, {lost} admin(s) lost writes')
+    print(f"✓ All {total} submissions and {total} questions were stored")
+
+
+# Conditional GET for the student quiz pages. Responses carry an ETag built
+# from the published quiz version and Last-Modified from the settings change
+# time; a matching If-None-Match or If-Modified-Since gets a 304 without
+# rendering the template.
+TEMPLATES_DIGEST = hashlib.sha256(''.join(TEMPLATES[name] for name in sorted(TEMPLATES)).encode('utf-8')).hexdigest()[:8]
+
+def quiz_etag(*parts):
+    payload = json.dumps([TEMPLATES_DIGEST, *parts], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+def settings_modified(*settings_list):
+    # Latest settings change as an aware datetime, or None if unrecorded
+    stamps = [s.get('updated_at') for s in settings_list]
+    if not stamps or None in stamps:
+        return None
+    return datetime.fromisoformat(max(stamps)).astimezone()
+
+def conditional_response(etag, last_modified, render, shared=False):
+    # Pending flash messages are rendered into the page, so always render
+    # then, and keep that response out of shared caches
+    if '_flashes' in session:
+        response = make_response(render())
+        shared = False
+    elif not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Revalidate on every use; per-student pages stay out of shared caches
+    response.cache_control.no_cache = True
+    if shared:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+        response.vary.add('Cookie')
+    return response
+
 # Routes
 @app.route('/')
 def home():
-    init_files()
-    return render_template_string(HOME_TEMPLATE)
+    return render_template('home.html')
 
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
-    # Clean up inactive admins on each login attempt
-    cleanup_inactive_admins()
-    
     if request.method == 'POST':
         action = request.form.get('action')
         username = request.form.get('username')
@@ -2078,29 +5375,25 @@ def admin_login():
                 flash('Passwords do not match!', 'error')
                 return redirect(url_for('admin_login'))
             
-            if username in admins:
-                flash('Username already exists!', 'error')
-                return redirect(url_for('admin_login'))
-            
             # Create new admin with email and phone
-            admins[username] = {
+            created = create_admin(username, {
                 'password': password,
                 'email': email,
                 'phone': phone,
                 'created_at': datetime.now().isoformat()
-            }
-            save_admins(admins)
+            })
+            if not created:
+                flash('Username already exists!', 'error')
+                return redirect(url_for('admin_login'))
             
             # Initialize quiz settings for new admin
-            quiz_settings = load_quiz_settings()
-            quiz_settings[username] = {'time_limit': 0}  # Default: no time limit
-            save_quiz_settings(quiz_settings)
+            save_admin_settings(username, {'time_limit': 0})  # Default: no time limit
             
-            # Send confirmation email
+            # Queue the confirmation email; the outbox worker sends it
             try:
                 send_admin_welcome_email(username, email)
             except Exception as e:
-                print(f'Failed to send email: {e}')
+                print(f'Failed to queue email: {e}')
             
             flash('Admin account created successfully! A confirmation email has been sent. Please login.', 'success')
             return redirect(url_for('admin_login'))
@@ -2115,7 +5408,7 @@ def admin_login():
             else:
                 flash('Invalid username or password!', 'error')
     
-    return render_template_string(ADMIN_LOGIN_TEMPLATE)
+    return render_template('admin_login.html')
 
 
 @app.route('/start', methods=['GET', 'POST'])
@@ -2125,20 +5418,14 @@ def start():
         student_id = request.form.get('student_id', '').strip()
         if not student_name or not student_id:
             flash('Please enter both name and registration number.', 'error')
-            return render_template_string(START_TEMPLATE)
+            return render_template('start.html')
 
         # Find allowed admins where this student appears
-        allowed = load_allowed()
-        matches = []
-        for admin_id, lst in allowed.items():
-            for entry in lst:
-                if (entry.get('name') or '').strip().lower() == student_name.lower() and (entry.get('student_id') or '').strip().lower() == student_id.lower():
-                    matches.append(admin_id)
-                    break
+        matches = find_allowed_admins(student_name, student_id)
 
         if not matches:
             flash('You are not allowed to take any quizzes. Contact the instructor.', 'error')
-            return render_template_string(START_TEMPLATE)
+            return render_template('start.html')
 
         # Save in session and redirect to quiz selection (filtered)
         session['student_name'] = student_name
@@ -2146,7 +5433,7 @@ def start():
         session['allowed_admins'] = matches
         return redirect(url_for('user_quiz'))
 
-    return render_template_string(START_TEMPLATE)
+    return render_template('start.html')
 
 
 @app.route('/student_logout')
@@ -2163,10 +5450,9 @@ def admin_panel():
         return redirect(url_for('admin_login'))
     
     current_admin = session['admin']
-    all_questions = load_questions()
     
     # Get questions for current admin only
-    admin_questions = all_questions.get(current_admin, [])
+    admin_questions = load_admin_questions(current_admin)
     
     if request.method == 'POST':
         question = {
@@ -2180,69 +5466,73 @@ def admin_panel():
             'correct_answer': request.form.get('correct_answer')
         }
         
-        admin_questions.append(question)
-        all_questions[current_admin] = admin_questions
-        save_questions(all_questions)
+        add_admin_question(current_admin, question)
         
         return redirect(url_for('admin_panel'))
     
-    # Get answers for current admin's quizzes
-    all_answers = load_answers()
-    admin_answers = all_answers.get(current_admin, [])
-
-    # Unique submitted student names (preserve order)
-    submitted_names = []
-    seen = set()
-    for entry in admin_answers:
-        name = (entry.get('student_name') or '').strip()
-        key = name.lower()
-        if name and key not in seen:
-            submitted_names.append(name)
-            seen.add(key)
-    
     # Get quiz settings
-    quiz_settings = load_quiz_settings()
-    admin_settings = quiz_settings.get(current_admin, {'time_limit': 0})
-    
-    # Process student results for display
-    student_results = []
-    percentages = []
-    for answer in admin_answers:
-        timestamp = datetime.fromisoformat(answer['timestamp'])
-        percentage = round((answer['score'] / answer['total']) * 100, 2) if answer['total'] > 0 else 0
-        percentages.append(percentage)
-        student_results.append({
-            'student_name': answer['student_name'],
-            'score': answer['score'],
-            'total': answer['total'],
-            'percentage': percentage,
-            'date': timestamp.strftime('%Y-%m-%d'),
-            'time': timestamp.strftime('%I:%M %p')
-        })
+    admin_settings = load_admin_settings(current_admin)
+    published_version, published_questions = load_published_quiz(current_admin)
+    draft_changed = bool(admin_questions) and quiz_version(admin_questions) != published_version
     
-    # Calculate analytics
-    analytics = {
-        'total_students': len(student_results),
-        'average_score': round(sum(percentages) / len(percentages), 2) if percentages else 0,
-        'highest_score': max(percentages) if percentages else 0,
-        'lowest_score': min(percentages) if percentages else 0,
-        'pass_count': sum(1 for p in percentages if p >= 70) if percentages else 0,
-        'fail_count': sum(1 for p in percentages if p < 70) if percentages else 0,
-        'pass_rate': round((sum(1 for p in percentages if p >= 70) / len(percentages) * 100), 2) if percentages else 0
-    }
+    # Student results are fetched page by page from admin_results_api;
+    # analytics are maintained incrementally on every submission
+    analytics = analytics_summary(load_admin_analytics(current_admin))
     # Load allowed students for this admin
-    allowed_data = load_allowed()
-    allowed_list = allowed_data.get(current_admin, [])
-
-    return render_template_string(ADMIN_PANEL_TEMPLATE, 
-                                 current_admin=current_admin,
-                                 questions=admin_questions,
-                                 student_results=student_results,
-                                 quiz_time_limit=admin_settings['time_limit'],
-                                 analytics=analytics,
-                                 percentages=percentages,
-                                 submitted_names=submitted_names,
-                                 allowed_list=allowed_list)
+    allowed_list = load_admin_allowed(current_admin)
+
+    return render_template('admin_panel.html',
+                           current_admin=current_admin,
+                           questions=admin_questions,
+                           published_version=published_version,
+                           published_count=len(published_questions),
+                           draft_changed=draft_changed,
+                           quiz_time_limit=admin_settings['time_limit'],
+                           analytics=analytics,
+                           submitter_count=count_submitters(current_admin),
+                           allowed_list=allowed_list)
+
+@app.route('/admin/api/results')
+@login_required
+def admin_results_api():
+    current_admin = session['admin']
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+    except ValueError:
+        limit = 50
+    try:
+        page, next_cursor, total = load_result_page(
+            current_admin,
+            sort=request.args.get('sort', 'time'),
+            order=request.args.get('order', 'asc'),
+            query=request.args.get('q', ''),
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = []
+    for result_id, student_name, score, total_questions, timestamp in page:
+        when = datetime.fromisoformat(timestamp)
+        results.append({
+            'id': result_id,
+            'student_name': student_name,
+            'score': score,
+            'total': total_questions,
+            'percentage': round((score / total_questions) * 100, 2) if total_questions > 0 else 0,
+            'date': when.strftime('%Y-%m-%d'),
+            'time': when.strftime('%I:%M %p'),
+            'pdf_url': url_for('download_pdf', result_id=result_id)
+        })
+    return jsonify({'results': results, 'next_cursor': next_cursor, 'total': total})
+
+@app.route('/admin/api/item-analysis')
+@login_required
+def item_analysis_api():
+    current_admin = session['admin']
+    version = request.args.get('version') or None
+    return jsonify(item_analysis(current_admin, version))
 
 @app.route('/admin/update-settings', methods=['POST'])
 @login_required
@@ -2253,14 +5543,18 @@ def update_quiz_settings():
     current_admin = session['admin']
     time_limit = int(request.form.get('time_limit', 0))
     
-    quiz_settings = load_quiz_settings()
-    quiz_settings[current_admin] = {'time_limit': time_limit}
-    save_quiz_settings(quiz_settings)
+    update_admin_settings(current_admin, time_limit=time_limit)
     
     flash('Quiz timer settings updated successfully!', 'success')
     return redirect(url_for('admin_panel'))
 
 
+@app.route('/admin/cache-stats')
+@login_required
+def admin_cache_stats():
+    return jsonify(dict(cache_stats(), pdf=pdf_cache_stats()))
+
+
 @app.route('/admin/upload-students', methods=['POST'])
 @login_required
 def upload_students():
@@ -2277,67 +5571,35 @@ def upload_students():
         flash('No file selected.', 'error')
         return redirect(url_for('admin_panel'))
 
+    mode = request.form.get('mode', 'replace')
+    if mode not in ROSTER_MODES:
+        flash('Unknown upload mode.', 'error')
+        return redirect(url_for('admin_panel'))
+
     try:
-        raw_content = f.stream.read().decode('utf-8').strip()
-        lines = raw_content.splitlines()
-        
-        if not lines:
-            flash('CSV file is empty.', 'error')
-            return redirect(url_for('admin_panel'))
+        report = parse_roster(iter_upload_rows(f.stream, f.filename), require_name=mode != 'remove')
         
-        # Detect delimiter: check first line for tabs or commas
-        first_line = lines[0]
-        delimiter = '\t' if '\t' in first_line else ','
-        
-        # Parse CSV with detected delimiter
-        reader = csv.reader(lines, delimiter=delimiter)
-        headers = next(reader, None)
-        
-        if not headers:
-            flash('CSV file has no headers.', 'error')
+        if not report['has_headers']:
+            flash('File is empty.', 'error')
             return redirect(url_for('admin_panel'))
         
-        # Find column indices for name and student_id
-        headers_lower = [h.lower().strip() for h in headers]
-        name_col = None
-        sid_col = None
-        
-        for i, h in enumerate(headers_lower):
-            if 'name' in h or 'student' in h:
-                if 'id' not in h:
-                    name_col = i
-            if 'id' in h or 'studentid' in h or 'reg' in h:
-                sid_col = i
-        
-        # Fallback: assume first column is name, second is ID
-        if name_col is None:
-            name_col = 0
-        if sid_col is None:
-            sid_col = 1 if len(headers) > 1 else None
-        
-        new_list = []
-        for row_num, row in enumerate(reader, start=2):
-            try:
-                name = (row[name_col].strip() if name_col < len(row) else '').strip()
-                sid = (row[sid_col].strip() if sid_col and sid_col < len(row) else '').strip()
-                
-                if name and sid:
-                    new_list.append({'name': name, 'student_id': sid})
-            except (IndexError, ValueError):
-                pass
+        if report['errors']:
+            more = report['error_count'] - len(report['errors'])
+            details = '; '.join(report['errors']) + (f'; and {more} more' if more else '')
+            flash(f"Skipped {report['error_count']} row(s): {details}", 'error')
         
+        new_list = report['students']
         if not new_list:
-            flash('No valid student entries found in CSV. Ensure format: Name, Student ID', 'error')
+            flash('No valid student entries found in file. Ensure format: Name, Student ID', 'error')
             return redirect(url_for('admin_panel'))
 
-        # Save to allowed file under current admin
-        allowed = load_allowed()
-        allowed[current_admin] = new_list
-        save_allowed(allowed)
+        # Apply to the allowed list under current admin
+        summary = update_admin_allowed(current_admin, new_list, mode)
         
-        flash(f'✓ Successfully uploaded {len(new_list)} student(s)!', 'success')
+        flash(f"✓ Student list updated: {summary['added']} added, {summary['updated']} updated, "
+              f"{summary['removed']} removed, {summary['unchanged']} unchanged.", 'success')
     except Exception as e:
-        flash(f'Failed to process CSV: {str(e)}. Ensure format is: Name (first column), Student ID (second column)', 'error')
+        flash(f'Failed to process file: {str(e)}. Ensure format is: Name (first column), Student ID (second column)', 'error')
 
     return redirect(url_for('admin_panel'))
 
@@ -2349,158 +5611,201 @@ def clear_results():
         return redirect(url_for('admin_login'))
     current_admin = session['admin']
     # Clear only current admin's results
-    all_answers = load_answers()
-    if current_admin in all_answers:
-        all_answers[current_admin] = []
-        save_answers(all_answers)
+    if clear_admin_answers(current_admin):
         flash('All student results cleared for this admin.', 'success')
     else:
         flash('No student results to clear.', 'error')
     return redirect(url_for('admin_panel'))
 
-@app.route('/admin/delete/<int:index>', methods=['POST'])
+@app.route('/admin/publish', methods=['POST'])
 @login_required
-def delete_question(index):
+def publish_questions():
     if 'admin' not in session:
         return redirect(url_for('admin_login'))
     
+    version = publish_quiz(session['admin'])
+    if version:
+        flash(f'Quiz published as version {version}.', 'success')
+    else:
+        flash('Add at least one question before publishing.', 'error')
+    return redirect(url_for('admin_panel'))
+
+@app.route('/admin/questions/import', methods=['POST'])
+@login_required
+def import_questions():
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
+    current_admin = session['admin']
+
+    f = request.files.get('questions_file')
+    if f is None or f.filename == '':
+        flash('No file selected.', 'error')
+        return redirect(url_for('admin_panel'))
+    mode = request.form.get('mode', 'append')
+    if mode not in ('append', 'replace'):
+        flash('Unknown import mode.', 'error')
+        return redirect(url_for('admin_panel'))
+
+    try:
+        report = parse_questions(iter_question_records(f.stream, f.filename))
+    except Exception as e:
+        flash(f'Failed to process file: {str(e)}', 'error')
+        return redirect(url_for('admin_panel'))
+
+    # All or nothing: a bank with invalid rows is not imported at all
+    if report['errors']:
+        more = report['error_count'] - len(report['errors'])
+        details = '; '.join(report['errors']) + (f'; and {more} more' if more else '')
+        flash(f"No questions imported, {report['error_count']} row(s) are invalid: {details}", 'error')
+        return redirect(url_for('admin_panel'))
+    if not report['questions']:
+        flash('No questions found in file.', 'error')
+        return redirect(url_for('admin_panel'))
+
+    summary = import_admin_questions(current_admin, report['questions'], mode)
+    flash(f"✓ Imported questions: {summary['added']} added, {summary['updated']} updated. "
+          f"Publish to make them available to students.", 'success')
+    return redirect(url_for('admin_panel'))
+
+@app.route('/admin/questions/export')
+@login_required
+def export_questions():
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
     current_admin = session['admin']
-    all_questions = load_questions()
-    admin_questions = all_questions.get(current_admin, [])
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in QUESTION_EXPORT_FORMATS:
+        flash('Unknown export format.', 'error')
+        return redirect(url_for('admin_panel'))
+    return send_file(export_admin_questions(current_admin, fmt),
+                     as_attachment=True,
+                     download_name=f"Questions_{current_admin}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}",
+                     mimetype=QUESTION_EXPORT_FORMATS[fmt])
+
+@app.route('/admin/delete/<question_id>', methods=['POST'])
+@login_required
+def delete_question(question_id):
+    if 'admin' not in session:
+        return redirect(url_for('admin_login'))
     
-    if 0 <= index < len(admin_questions):
-        admin_questions.pop(index)
-        all_questions[current_admin] = admin_questions
-        save_questions(all_questions)
+    current_admin = session['admin']
+    delete_admin_question(current_admin, question_id)
     
     return redirect(url_for('admin_panel'))
 
-@app.route('/admin/download-pdf/<int:index>')
+def send_pdf(report, download_name):
+    # report is a cache file or, right after rendering, a BytesIO
+    response = send_file(report, as_attachment=True, download_name=download_name, mimetype='application/pdf')
+    if not isinstance(report, BytesIO):
+        response.content_length = os.fstat(report.fileno()).st_size
+    return response
+
+@app.route('/admin/download-pdf/<result_id>')
 @login_required
-def download_pdf(index):
+def download_pdf(result_id):
     if 'admin' not in session:
         return redirect(url_for('admin_login'))
     
     current_admin = session['admin']
-    all_answers = load_answers()
-    admin_answers = all_answers.get(current_admin, [])
+    result = load_admin_answer(current_admin, result_id)
     
-    if 0 <= index < len(admin_answers):
-        result = admin_answers[index]
+    if result is not None:
         timestamp = datetime.fromisoformat(result['timestamp'])
-        percentage = round((result['score'] / result['total']) * 100, 2) if result['total'] > 0 else 0
-        
-        # Create PDF in memory
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-        
-        # Container for PDF elements
-        elements = []
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#333333'),
-            spaceAfter=30,
-            alignment=TA_CENTER
-        )
-        
-        # Title
-        title = Paragraph("Quiz Result Report", title_style)
-        elements.append(title)
-        elements.append(Spacer(1, 0.2*inch))
-        
-        # Student Info
-        student_info_data = [
-            ['Student Name:', result['student_name']],
-            ['Date:', timestamp.strftime('%Y-%m-%d')],
-            ['Time:', timestamp.strftime('%I:%M %p')],
-        ]
-        
-        student_table = Table(student_info_data, colWidths=[2*inch, 4*inch])
-        student_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f0f0')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('TOPPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd'))
-        ]))
-        elements.append(student_table)
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Score Summary
-        grade = 'A' if percentage >= 70 else 'B' if percentage >= 60 else 'C' if percentage >= 50 else 'D' if percentage >= 40 else 'F'
-        
-        score_data = [
-            ['SCORE', 'PERCENTAGE', 'GRADE'],
-            [f"{result['score']}/{result['total']}", f"{percentage}%", grade]
-        ]
-        
-        score_table = Table(score_data, colWidths=[2*inch, 2*inch, 2*inch])
-        score_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('FONTSIZE', (0, 1), (-1, 1), 18),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 15),
-            ('TOPPADDING', (0, 0), (-1, -1), 15),
-            ('BACKGROUND', (0, 1), (-1, 1), colors.HexColor('#f9f9f9')),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd'))
-        ]))
-        elements.append(score_table)
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Questions
-        for idx, item in enumerate(result['results'], 1):
-            question_data = [
-                [f"Q{idx}: {item['question']}"],
-                [f"Student's Answer: {item['user_answer']}"]
-            ]
-            
-            if not item['correct']:
-                question_data.append([f"Correct Answer: {item['correct_answer']}"])
-            
-            question_table = Table(question_data, colWidths=[6.5*inch])
-            
-            table_style = [
-                ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f9f9f9')),
-                ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('PADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dddddd')),
-            ]
-            
-            if item['correct']:
-                table_style.append(('LINEAFTER', (0, 0), (0, -1), 4, colors.HexColor('#27ae60')))
-            else:
-                table_style.append(('LINEAFTER', (0, 0), (0, -1), 4, colors.HexColor('#e74c3c')))
-            
-            question_table.setStyle(TableStyle(table_style))
-            elements.append(question_table)
-            elements.append(Spacer(1, 0.15*inch))
-        
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
         
         # Return PDF as download
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=f"Quiz_Result_{result['student_name'].replace(' ', '_')}_{timestamp.strftime('%Y%m%d')}.pdf",
-            mimetype='application/pdf'
-        )
+        return send_pdf(open_result_pdf(current_admin, result),
+                        f"Quiz_Result_{result['student_name'].replace(' ', '_')}_{timestamp.strftime('%Y%m%d')}.pdf")
     
     return redirect(url_for('admin_panel'))
 
+@app.route('/admin/api/exports', methods=['GET', 'POST'])
+@login_required
+def export_jobs_api():
+    current_admin = session['admin']
+    if request.method == 'GET':
+        return jsonify({'jobs': [export_job_status(job) for job in list_export_jobs(current_admin)]})
+
+    data = request.get_json(silent=True) or request.form
+    kind = data.get('kind')
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    params = {}
+    if kind == 'excel':
+        download_name = f"Student_Results_{current_admin}_{stamp}.xlsx"
+    elif kind == 'pdf':
+        result_id = data.get('result_id')
+        if not isinstance(result_id, str) or not result_id:
+            return jsonify({'error': 'A result id is required.'}), 400
+        params['result_id'] = result_id
+        download_name = f"Quiz_Result_{current_admin}_{result_id}_{stamp}.pdf"
+    elif kind == 'pdf-zip':
+        download_name = f"Student_Reports_{current_admin}_{stamp}.zip"
+    elif kind == 'class-pdf':
+        download_name = f"Class_Report_{current_admin}_{stamp}.pdf"
+    else:
+        return jsonify({'error': 'Unknown export type.'}), 400
+
+    job, error = submit_export_job(current_admin, kind, params, download_name)
+    if error:
+        return jsonify({'error': error}), 429
+    status = export_job_status(job)
+    return jsonify(status), 202, {'Location': status['status_url']}
+
+@app.route('/admin/api/exports/<job_id>')
+@login_required
+def export_job_api(job_id):
+    job = load_export_job(job_id)
+    if job is None or job['admin_id'] != session['admin']:
+        return jsonify({'error': 'Export not found.'}), 404
+    if expire_export_job(job):
+        return jsonify({'error': 'Export has expired.'}), 410
+    return jsonify(export_job_status(job))
+
+@app.route('/admin/api/exports/<job_id>/download')
+@login_required
+def export_job_download(job_id):
+    job = load_export_job(job_id)
+    if job is None or job['admin_id'] != session['admin'] or job['status'] != 'done':
+        return jsonify({'error': 'Export not found or not ready.'}), 404
+    if expire_export_job(job):
+        return jsonify({'error': 'Export has expired.'}), 410
+    try:
+        artifact = open(_export_artifact_path(job), 'rb')
+    except FileNotFoundError:
+        return jsonify({'error': 'Export has expired.'}), 410
+    response = send_file(artifact, as_attachment=True, download_name=job['download_name'],
+                         mimetype=EXPORT_KINDS[job['kind']][1])
+    response.content_length = os.fstat(artifact.fileno()).st_size
+    return response
+
+def sync_export_too_large(admin_id):
+    # The synchronous download routes are the no-JS fallback for export jobs
+    if load_admin_analytics(admin_id)['count'] <= SYNC_EXPORT_MAX_RESULTS:
+        return False
+    flash(f'More than {SYNC_EXPORT_MAX_RESULTS} results: enable JavaScript to run this export in the background.', 'error')
+    return True
+
+@app.route('/admin/download-pdfs')
+@login_required
+def download_all_pdfs():
+    current_admin = session['admin']
+    if sync_export_too_large(current_admin):
+        return redirect(url_for('admin_panel'))
+    results = load_admin_answers(current_admin)
+    if not results:
+        flash('No student results to export yet.', 'error')
+        return redirect(url_for('admin_panel'))
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    if request.args.get('combined') == '1':
+        return send_pdf(open_class_pdf(current_admin, results), f"Class_Report_{current_admin}_{stamp}.pdf")
+    
+    return Response(
+        iter_results_zip(current_admin, results),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="Student_Reports_{current_admin}_{stamp}.zip"'}
+    )
+
 @app.route('/admin/download-excel')
 @login_required
 def download_excel():
@@ -2508,76 +5813,21 @@ def download_excel():
         return redirect(url_for('admin_login'))
     
     current_admin = session['admin']
-    all_answers = load_answers()
-    admin_answers = all_answers.get(current_admin, [])
-    
-    # Create Excel workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Student Results"
-    
-    # Style definitions
-    header_fill = PatternFill(start_color="E74C3C", end_color="E74C3C", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=12)
-    
-    # Headers
-    headers = ['Student Name', 'Score', 'Total', 'Percentage', 'Grade', 'Date', 'Time']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Data rows
-    for row_idx, answer in enumerate(admin_answers, 2):
-        timestamp = datetime.fromisoformat(answer['timestamp'])
-        percentage = round((answer['score'] / answer['total']) * 100, 2) if answer['total'] > 0 else 0
-        grade = 'A' if percentage >= 70 else 'B' if percentage >= 60 else 'C' if percentage >= 50 else 'D' if percentage >= 40 else 'F'
-        
-        ws.cell(row=row_idx, column=1, value=answer['student_name'])
-        ws.cell(row=row_idx, column=2, value=answer['score'])
-        ws.cell(row=row_idx, column=3, value=answer['total'])
-        ws.cell(row=row_idx, column=4, value=percentage)
-        ws.cell(row=row_idx, column=5, value=grade)
-        ws.cell(row=row_idx, column=6, value=timestamp.strftime('%Y-%m-%d'))
-        ws.cell(row=row_idx, column=7, value=timestamp.strftime('%I:%M %p'))
-        
-        # Color code based on grade
-        if percentage >= 70:
-            grade_color = "27AE60"
-        elif percentage >= 50:
-            grade_color = "F39C12"
-        else:
-            grade_color = "E74C3C"
-        
-        ws.cell(row=row_idx, column=4).font = Font(bold=True, color=grade_color)
-        ws.cell(row=row_idx, column=5).font = Font(bold=True, color=grade_color)
-    
-    # Adjust column widths
-    for col in ws.columns:
-        max_length = 0
-        col_letter = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[col_letter].width = adjusted_width
-    
-    # Save to BytesIO
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    if sync_export_too_large(current_admin):
+        return redirect(url_for('admin_panel'))
+    export = export_results_excel(current_admin)
+    size = export.seek(0, os.SEEK_END)
+    export.seek(0)
     
-    # Return Excel file as download
-    return send_file(
-        buffer,
+    # Stream the Excel file as download
+    response = send_file(
+        export,
         as_attachment=True,
         download_name=f"Student_Results_{current_admin}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
+    response.content_length = size
+    return response
 
 @app.route('/logout')
 def logout():
@@ -2594,49 +5844,79 @@ def user_quiz():
     student_name = session.get('student_name')
     student_id = session.get('student_id')
 
-    all_questions = load_questions()
     quiz_settings = load_quiz_settings()
     allowed_admins = session.get('allowed_admins', [])
 
     available_quizzes = []
-    for admin_id, questions in all_questions.items():
-        if questions and (not allowed_admins or admin_id in allowed_admins):  # Only show allowed admins (or all if not filtered)
-            admin_settings = quiz_settings.get(admin_id, {'time_limit': 0})
+    listed_settings = []
+    for admin_id, admin_settings in quiz_settings.items():
+        if not allowed_admins or admin_id in allowed_admins:  # Only show allowed admins (or all if not filtered)
+            # Only published quizzes are listed, with their published questions
+            version = admin_settings.get('published_version')
+            questions = load_quiz_version(admin_id, version) if version else None
+            if not questions:
+                continue
             available_quizzes.append({
                 'admin_id': admin_id,
                 'admin_name': admin_id,
                 'question_count': len(questions),
                 'time_limit': admin_settings['time_limit']
             })
+            listed_settings.append(admin_settings)
 
-    return render_template_string(QUIZ_SELECT_TEMPLATE, available_quizzes=available_quizzes)
+    return conditional_response(quiz_etag(available_quizzes),
+                                settings_modified(*listed_settings),
+                                lambda: render_template('quiz_select.html', available_quizzes=available_quizzes))
 
 @app.route('/quiz/<admin_id>')
 def take_quiz(admin_id):
-    # Get specific admin's questions
-    all_questions = load_questions()
-    questions = all_questions.get(admin_id, [])
+    # Serve the published snapshot; draft edits don't reach students
+    version, questions = load_published_quiz(admin_id)
     
     # Get timer settings
-    quiz_settings = load_quiz_settings()
-    admin_settings = quiz_settings.get(admin_id, {'time_limit': 0})
+    admin_settings = load_admin_settings(admin_id)
     
-    # Load existing student names for this admin (to prevent duplicates)
-    all_answers = load_answers()
-    admin_answers = all_answers.get(admin_id, [])
-    existing_names = [entry.get('student_name','').strip() for entry in admin_answers if entry.get('student_name')]
+    # Eligibility is checked by verify_student, so the page is the same for
+    # every student and its size doesn't grow with the class
+    etag = quiz_etag(admin_id, version, admin_settings['time_limit'])
+    return conditional_response(etag, settings_modified(admin_settings),
+                                lambda: render_template('user_quiz.html',
+                                                        questions=questions,
+                                                        quiz_version=version,
+                                                        admin_name=admin_id,
+                                                        admin_id=admin_id,
+                                                        time_limit=admin_settings['time_limit']),
+                                shared=True)
 
-    # Load allowed students for this admin
-    allowed = load_allowed()
-    allowed_list = allowed.get(admin_id, [])
+@app.route('/quiz/<admin_id>/verify', methods=['POST'])
+def verify_student(admin_id):
+    # Entry check for the quiz page, backed by the roster and submitter indexes
+    data = request.get_json(silent=True) or request.form
+    student_name = (data.get('student_name') or '').strip()
+    student_id = (data.get('student_id') or '').strip()
+    if not student_name or not student_id:
+        return jsonify({'error': 'Please enter both name and registration number.'}), 400
+    if not is_student_allowed(admin_id, student_name, student_id):
+        return jsonify({'error': 'You are not allowed to take this quiz. Please contact the instructor.'}), 403
+    if has_submitted(admin_id, student_name, student_id):
+        return jsonify({'error': 'You have already submitted this quiz.'}), 409
+    return jsonify({'ok': True})
 
-    return render_template_string(USER_QUIZ_TEMPLATE, 
-                                 questions=questions, 
-                                 admin_name=admin_id,
-                                 admin_id=admin_id,
-                                 time_limit=admin_settings['time_limit'],
-                                 existing_names=existing_names,
-                                 allowed_list=allowed_list)
+@app.route('/api/quiz/<admin_id>')
+def quiz_payload(admin_id):
+    # Published questions without the answer key, for cached clients
+    version, questions = load_published_quiz(admin_id)
+    if version is None:
+        return jsonify({'error': 'Quiz not found'}), 404
+    admin_settings = load_admin_settings(admin_id)
+    payload = {
+        'admin_id': admin_id,
+        'quiz_version': version,
+        'time_limit': admin_settings['time_limit'],
+        'questions': [{'id': q['id'], 'question': q['question'], 'options': q['options']} for q in questions]
+    }
+    etag = quiz_etag(admin_id, version, admin_settings['time_limit'])
+    return conditional_response(etag, settings_modified(admin_settings), lambda: jsonify(payload), shared=True)
 
 @app.route('/quiz/submit', methods=['POST'])
 def submit_quiz():
@@ -2644,71 +5924,61 @@ def submit_quiz():
     student_id = request.form.get('student_id')
     admin_id = request.form.get('admin_id')
     
-    all_questions = load_questions()
-    questions = all_questions.get(admin_id, [])
+    # Grade against the version the student was served, so attempts that
+    # were in progress when the quiz was republished still count
+    version = request.form.get('quiz_version')
+    questions = load_quiz_version(admin_id, version)
+    if questions is None:
+        flash('This quiz has changed. Please start it again.', 'error')
+        return redirect(url_for('take_quiz', admin_id=admin_id))
     
+    # Store only the chosen letter per question id; the question text and
+    # answer key are resolved from the quiz version when results are shown
     score = 0
-    results = []
+    answers = {}
     
-    for i, question in enumerate(questions):
-        user_answer = request.form.get(f'q{i}')
-        correct = user_answer == question['correct_answer']
-        if correct:
+    for question in questions:
+        user_answer = request.form.get(f"q_{question['id']}")
+        if user_answer:
+            answers[question['id']] = user_answer
+        if user_answer == question['correct_answer']:
             score += 1
-        
-        results.append({
-            'question': question['question'],
-            'user_answer': user_answer,
-            'correct_answer': question['correct_answer'],
-            'correct': correct
-        })
     
-    # Save results under admin's data
-    all_answers = load_answers()
-    if admin_id not in all_answers:
-        all_answers[admin_id] = []
     # Require student_id and verify against allowed list
     if not student_id or not student_name:
         flash('Please provide both name and student ID.', 'error')
         return redirect(url_for('take_quiz', admin_id=admin_id))
 
-    allowed = load_allowed()
-    admin_allowed = allowed.get(admin_id, [])
-    name_norm = student_name.strip().lower()
-    id_norm = student_id.strip().lower()
-    allowed_match = any((entry.get('name') or '').strip().lower() == name_norm and (entry.get('student_id') or '').strip().lower() == id_norm for entry in admin_allowed)
-    if not allowed_match:
+    if not is_student_allowed(admin_id, student_name, student_id):
         flash('You are not allowed to take this quiz. Please contact the instructor.', 'error')
         return redirect(url_for('take_quiz', admin_id=admin_id))
 
-    # Enforce unique student names per admin (case-insensitive)
-    normalized = name_norm
-    existing = any(entry.get('student_name','').strip().lower() == normalized for entry in all_answers.get(admin_id, []))
-    if existing:
-        flash(f"The name '{student_name}' has already submitted this quiz.", 'error')
-        return redirect(url_for('take_quiz', admin_id=admin_id))
-
-    # Save results under admin's data
-    all_answers[admin_id].append({
+    # Save results under admin's data, one submission per student (case-insensitive)
+    entry = {
         'student_name': student_name,
+        'student_id': student_id,
         'score': score,
         'total': len(questions),
         'timestamp': datetime.now().isoformat(),
-        'results': results
-    })
-    save_answers(all_answers)
+        'quiz_version': version,
+        'answers': answers
+    }
+    saved = add_answer(admin_id, entry)
+    if not saved:
+        flash(f"The name '{student_name}' has already submitted this quiz.", 'error')
+        return redirect(url_for('take_quiz', admin_id=admin_id))
     
     percentage = round((score / len(questions)) * 100, 2) if len(questions) > 0 else 0
+    results = expand_result(admin_id, entry)['results']
     
-    return render_template_string(RESULTS_TEMPLATE, 
-                                  student_name=student_name,
-                                  score=score, 
-                                  total=len(questions),
-                                  percentage=percentage,
-                                  results=results)
+    return render_template('results.html',
+                           student_name=student_name,
+                           score=score,
+                           total=len(questions),
+                           percentage=percentage,
+                           results=results)
 
 if __name__ == '__main__':
-    init_files()
     print("\n" + "="*50)
     print("🚀 Quiz System Starting...")
     print("="*50)
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session')
+def quiz(tmp_path_factory):
+    # app.py sets up its storage in the working directory on import, so
+    # import it from a scratch directory
+    os.environ['QUIZ_SWEEP_INTERVAL'] = '0'
+    os.chdir(tmp_path_factory.mktemp('quiz'))
+    sys.path.insert(0, ROOT)
+    import app
+    return app
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+PROCESSES = 4
+WRITES = 15
+ADMINS = 2
+
+BACKENDS = {
+    'json': {'QUIZ_STORAGE': 'json', 'QUIZ_SUBMISSION_LOG': '0'},
+    'log': {'QUIZ_STORAGE': 'json', 'QUIZ_SUBMISSION_LOG': '1'},
+    'sqlite': {'QUIZ_STORAGE': 'sqlite', 'QUIZ_SUBMISSION_LOG': '0'},
+}
+
+
+def run(call, args, cwd, env):
+    code = f'import sys, app; sys.exit(app.{call}(*map(int, sys.argv[1:])))'
+    return subprocess.Popen([sys.executable, '-c', code, *map(str, args)], cwd=cwd, env=env)
+
+
+@pytest.mark.parametrize('backend', sorted(BACKENDS))
+def test_concurrent_writers_lose_nothing(tmp_path, backend):
+    env = dict(os.environ, QUIZ_SWEEP_INTERVAL='0', PYTHONPATH=ROOT, **BACKENDS[backend])
+    for name in ('QUIZ_DATA_DIR', 'QUIZ_DATABASE', 'QUIZ_OUTBOX_DIR', 'QUIZ_PDF_CACHE_DIR', 'QUIZ_EXPORT_DIR'):
+        env.pop(name, None)
+    writers = [run('stress_writer', (worker, WRITES, ADMINS), tmp_path, env) for worker in range(PROCESSES)]
+    assert [p.wait() for p in writers] == [0] * PROCESSES
+    assert run('stress_check', (PROCESSES, WRITES, ADMINS), tmp_path, env).wait() == 0
@@ -0,0 +1,14 @@
+import pytest
+from flask import render_template, render_template_string
+
+
+def test_every_template_is_benchmarked(quiz):
+    assert set(quiz._bench_contexts()) == set(quiz.TEMPLATES)
+
+
+@pytest.mark.parametrize('name', ['home.html', 'start.html', 'admin_login.html', 'admin_panel.html',
+                                  'quiz_select.html', 'user_quiz.html', 'results.html'])
+def test_cached_render_matches_string_render(quiz, name):
+    context = quiz._bench_contexts()[name]
+    with quiz.app.test_request_context('/'):
+        assert render_template(name, **context) == render_template_string(quiz.TEMPLATES[name], **context)